@@ -18,10 +18,42 @@ christmas_movies.csv and visual_objects.py are required to run this code.
 
 
 import csv
+import os
+import threading
+from concurrent.futures import Future
+
 import pygame
 
+from csv_reload import CsvWatcher, patch_trees
+from frame_profiler import NO_PROFILER, FrameProfiler
+from movie_cache import load_cached_trees, open_columns
+from movie_filter import FilterIndex, FilterPanel
+from movie_search import HIGHLIGHT_COLOR as SEARCH_HIGHLIGHT_COLOR, SearchPanel, open_search_index
+from movie_table import (
+    BULB_SIZE_MAPPINGS,
+    HEIGHT_MAPPINGS,
+    HeightScale,
+    apply_bulb_radii,
+    bulb_radii,
+    open_movie_table,
+)
+from movie_records import movie_dict, parse_movie_row, parse_votes
+from layout_cache import LayoutCache
+from layout_worker import LayoutWorker
+from lod_view import ZOOM_LEVELS, LodView
+from movie_stream import load_trees_parallel, load_trees_streaming
+from rating_aggregators import RATING_AGGREGATORS, SketchGroups
+from record_store import RECORD_SUFFIX, load_record_trees
+from scene_layers import LayerCompositor
+from tree_collection import TreeCollection
+from tree_window import TreeWindowManager
 from visual_objects import (
+    DEFAULT_LAYOUT,
+    RATING_COLORS,
+    TEXT_CACHE,
+    BulbSpriteAtlas,
     Tree,
+    TreeSpriteCache,
     compute_tree_height,
 )
 
@@ -29,16 +61,36 @@ DATA_PATH = "christmas_movies.csv"
 WINDOW_SIZE = 10
 TREE_WIDTH = 110  
 BULB_UPDATE_PERIOD = 30  # Frames between bulb position updates.
+# "vectorized", "poisson" or "random" (see visual_objects.BULB_LAYOUTS). The pure-Python
+# Poisson sampler is several times slower and shares the GIL with the render loop.
+BULB_LAYOUT = DEFAULT_LAYOUT
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024  # Larger csv files are parsed by a process pool.
+STREAMING_MIN_BYTES = 256 * 1024 * 1024  # Larger csv files are streamed, not cached.
+PROFILER_OVERLAY_KEY = pygame.K_F3  # Shows or hides the per-stage timing overlay.
+PROFILER_DUMP_KEY = pygame.K_F4  # Writes the recent timings as a Chrome trace file.
+ZOOM_OUT_KEYS = (pygame.K_MINUS, pygame.K_KP_MINUS)
+ZOOM_IN_KEYS = (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS)
+FILTER_PANEL_KEY = pygame.K_f  # Shows or hides the genre/rating/director/runtime filters.
+SEARCH_KEY = pygame.K_SLASH  # Opens the search box; Enter closes it, Escape clears it.
+# Cycles what tree height shows (see movie_table.HEIGHT_MAPPINGS; for streamed csv
+# files, rating_aggregators.RATING_AGGREGATORS).
+HEIGHT_MAPPING_KEY = pygame.K_h
+BULB_SIZE_KEY = pygame.K_b  # Cycles what bulb size shows (see movie_table.BULB_SIZE_MAPPINGS).
 
 # ====================================================
 # LOAD DATA FROM FILE 
 # ====================================================
 
-def load_trees(path):
+def load_trees(path, use_cache=True):
     """
     Load Christmas movies from csv and group them by release year.
     Returns a list of tree objects sorted by year.
+    With use_cache, the csv is read through the columnar cache in movie_cache.py,
+    which is rebuilt automatically whenever the csv changes.
     """
+    if use_cache:
+        return load_cached_trees(path)
+
     years = {}
     
     with open(path, newline="", encoding="utf-8") as csvfile:
@@ -46,47 +98,63 @@ def load_trees(path):
 
         for row in reader:
             # Skip rows without a release year.
-            if not row.get("release_year"):
+            parsed = parse_movie_row(row)
+            if parsed is None:
                 continue
-            try:
-                year = int(float(row["release_year"]))
-            except ValueError:
-                continue
-
-            # Read the IMDb rating and store it to visualize the tree's height.
-            imdb = None
-            if row.get("imdb_rating"):
-                try:
-                    imdb = float(row["imdb_rating"])
-                except ValueError:
-                    imdb = None
-
-            # Content rating category(G/PG/PG-13/etc) for the Christmas bulb's color.
-            rating_cat = row.get("rating")
+            year, imdb, rating_cat, title = parsed
 
             # Store the IMDb rating and content rating category for each movie in a dictionary.
-            years.setdefault(year, {"ratings": [], "movies": []})
+            years.setdefault(year, {"ratings": [], "movies": [], "votes": 0})
 
             if imdb is not None:
                 years[year]["ratings"].append(imdb)
+            years[year]["votes"] += parse_votes(row.get("votes")) or 0
 
-            years[year]["movies"].append(
-                {
-                    "title": row.get("title", "").strip(),
-                    "imdb_rating": imdb,
-                    "rating_cat": rating_cat,
-                }
-            )
+            years[year]["movies"].append(movie_dict(title, imdb, rating_cat))
     
     # Build visual tree objects from the data.
     trees = []
     for year, d in sorted(years.items()):
         ratings = d["ratings"]
         avg_rating = sum(ratings) / len(ratings) if ratings else None
-        trees.append(Tree(year, avg_rating, d["movies"]))
+        trees.append(Tree(year, avg_rating, d["movies"], total_votes=d["votes"],
+                          rated_count=len(ratings)))
     
     return trees
 
+
+def loader_kind(path):
+    """
+    Which loader load_trees_for() uses: "records" for a record store
+    (record_store.py), then by csv size "cached" for small files, "parallel"
+    for large ones (the sharded parser) and "streaming" for huge ones
+    (the bounded-memory streaming loader).
+    """
+    if path.endswith(RECORD_SUFFIX):
+        return "records"
+    size = os.path.getsize(path)
+    if size >= STREAMING_MIN_BYTES:
+        return "streaming"
+    if size >= PARALLEL_MIN_BYTES and (os.cpu_count() or 1) > 1:
+        return "parallel"
+    return "cached"
+
+
+def load_trees_for(path):
+    """
+    Load the trees with the loader picked by loader_kind(). A record store is
+    mapped directly; main() then runs without the csv-only features.
+    """
+    kind = loader_kind(path)
+    if kind == "records":
+        return load_record_trees(path)
+    if kind == "streaming":
+        return load_trees_streaming(path)
+    if kind == "parallel":
+        return load_trees_parallel(path)
+    return load_trees(path)
+
+
 # ====================================================
 # INTERACTIVE SLIDER
 # ==================================================== 
@@ -112,12 +180,51 @@ def draw_slider(screen, font, trees, start_idx, window_size,
     if trees:
         start_year = trees[start_idx].year
         end_idx = min(start_idx + window_size - 1, len(trees) - 1)
-        end_year = trees[end_idx].year
+        # A decade summary ends at its last year, not at its first.
+        end_year = getattr(trees[end_idx], "last_year", trees[end_idx].year)
         label = f"Slide to Change Year Range: {start_year} - {end_year}"
-        text = font.render(label, True, label_color)
+        text = TEXT_CACHE.render(font, label, label_color)
         screen.blit(text, (x, y - 32))
 
 
+def format_count(n):
+    """Short form of a large count: 950, 35.4K, 1.2M."""
+    for limit, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if n >= limit:
+            return f"{n / limit:.1f}{suffix}"
+    return str(n)
+
+
+def draw_range_summary(screen, font, summary, slider_rect):
+    """
+    Draw the statistics of the selected years at the right end of the slider
+    label: movie count, mean IMDb rating, total votes and a bar with the mix
+    of rating categories.
+    """
+    label_color = (230, 230, 230)
+    x, y, w, h = slider_rect
+    bar_w, bar_h = 120, 10
+    bar = pygame.Rect(x + w - bar_w, y - 28, bar_w, bar_h)
+
+    rating = "-" if summary.avg_rating is None else f"{summary.avg_rating:.1f}"
+    movies = "movie" if summary.movie_count == 1 else "movies"
+    label = (f"{summary.movie_count} {movies}   avg IMDb {rating}   "
+             f"{format_count(summary.total_votes)} votes")
+    text = TEXT_CACHE.render(font, label, label_color)
+    screen.blit(text, text.get_rect(midright=(bar.x - 12, bar.centery)))
+
+    # One segment per rating category, as wide as its share of the movies.
+    total = sum(summary.category_counts)
+    left = bar.x
+    for i, n in enumerate(summary.category_counts):
+        if not total or not n:
+            continue
+        right = bar.x + round(bar_w * sum(summary.category_counts[:i + 1]) / total)
+        pygame.draw.rect(screen, RATING_COLORS[i], (left, bar.y, right - left, bar_h))
+        left = right
+    pygame.draw.rect(screen, label_color, bar, 1)
+
+
 def slider_value_from_mouse(x_pos, trees, window_size, slider_rect):
     x, y, w, h = slider_rect
     max_start = max(0, len(trees) - window_size)
@@ -140,7 +247,7 @@ def draw_legend(surface, legend_font, x, y):
     ]
     color = (255, 255, 255)
     for i, (left, right) in enumerate(legend_items):
-        text = legend_font.render(f"{left} : {right}", True, color)
+        text = TEXT_CACHE.render(legend_font, f"{left} : {right}", color)
         surface.blit(text, (x, y + i*20))
 
 
@@ -148,28 +255,111 @@ def draw_legend(surface, legend_font, x, y):
 # VISUALIZATION OF CHRISTMAS MOVIES
 # ====================================================
 
-def draw_visualization(screen, trees, font, title_font, legend_font, window_start, window_size,
-                       frame, slider_rect, handle_radius, background_img):
-    W, H = screen.get_size()
-    screen.blit(background_img, (0, 0))
+TITLE = "Christmas Movies Visualization (1934-2023)"
 
-    # Create the title of this visualization. 
-    title_surf = title_font.render("Christmas Movies Visualization (1934-2023)", True, (255, 255, 255))
-    title_rect = title_surf.get_rect(center=(W // 2, 40))
-    screen.blit(title_surf, title_rect)
+# Consistent colors.
+TREE_COLOR = (0, 50, 20)
+TRUNK_COLOR = (10, 20, 10)
+TEXT_COLOR = (240, 240, 240)
 
-    if not trees:
-        return
 
-    # Clamp visible window.
+def visible_window(trees, window_start, window_size):
+    """Clamp the window start and return (window_start, visible trees)."""
     window_start = max(0, min(window_start, len(trees) - 1))
     visible = trees[window_start: window_start + window_size]
     if not visible:
         visible = trees[-window_size:]
+    return window_start, visible
+
+
+def tree_height(trees, tree, height_scale=None):
+    """
+    Tree height in pixels, scaled against the rating range of the whole collection,
+    or taken from a HeightScale (movie_table.py) for another height mapping.
+    """
+    if height_scale is not None:
+        return height_scale.height(tree)
+    # The rating range is kept up to date by TreeCollection, not rescanned per frame.
+    rating_min = trees.rating_min if trees.rating_min is not None else 0
+    rating_max = trees.rating_max if trees.rating_max is not None else 10
+    return compute_tree_height(tree.avg_rating, rating_min, rating_max)
+
+
+def draw_static_layer(surface, title_font, legend_font, slider_rect, background_img,
+                      profiler=NO_PROFILER):
+    """Draw the parts of the scene that never change: background, title and legend."""
+    W, H = surface.get_size()
+    with profiler.timer("background"):
+        surface.blit(background_img, (0, 0))
+
+        # Create the title of this visualization. 
+        title_surf = TEXT_CACHE.render(title_font, TITLE, (255, 255, 255))
+        title_rect = title_surf.get_rect(center=(W // 2, 40))
+        surface.blit(title_surf, title_rect)
+
+    # Draw legend (left-top).
+    with profiler.timer("legend"):
+        legend_y = slider_rect.y + slider_rect.height + 45
+        draw_legend(surface, legend_font, x=40, y=legend_y)
+
+
+def make_compositor(screen, title_font, legend_font, slider_rect, handle_radius,
+                    background_img):
+    """Bake the static layer once and split the screen into slider and tree areas."""
+    W, H = screen.get_size()
+    static_layer = pygame.Surface((W, H)).convert()
+    draw_static_layer(static_layer, title_font, legend_font, slider_rect, background_img)
+
+    # The slider label sits 32px above the bar; the handle overhangs it.
+    top = slider_rect.y - 36
+    bottom = slider_rect.bottom + handle_radius + 4
+    slider_area = pygame.Rect(0, top, W, bottom - top)
+    tree_area = pygame.Rect(0, bottom, W, H - bottom)
+    return LayerCompositor(static_layer, slider_area, tree_area)
+
+
+def begin_scene(screen, title_font, legend_font, slider_rect, background_img,
+                compositor, slider_key, profiler=NO_PROFILER):
+    """
+    Put the static layer under this frame and return (dirty rects, slider_dirty).
+    slider_key changes whenever the slider has to be redrawn.
+    """
+    if compositor is None:
+        draw_static_layer(screen, title_font, legend_font, slider_rect, background_img,
+                          profiler)
+        return [screen.get_rect()], True
+    with profiler.timer("background"):
+        dirty = compositor.begin_frame(screen, slider_key)
+    return dirty, compositor.slider_dirty
+
+
+def draw_visualization(screen, trees, font, title_font, legend_font, window_start, window_size,
+                       frame, slider_rect, handle_radius, background_img, compositor=None,
+                       sprite_cache=None, bulb_atlas=None, layout_worker=None,
+                       window_manager=None, profiler=NO_PROFILER, layout_cache=None,
+                       search=None, height_scale=None):
+    """
+    Draw one frame and return the list of screen rects that changed.
+    Without a compositor the whole scene is redrawn; with one, only the layers
+    that changed are redrawn (see scene_layers.py). A TreeSpriteCache turns
+    each tree body into a single blit, and a BulbSpriteAtlas batches the bulbs.
+    A LayoutWorker moves bulb placement off the render loop, and a
+    TreeWindowManager prefetches layouts ahead of the slider and evicts old ones.
+    A FrameProfiler records the time spent in each stage. A LayoutCache reuses
+    bulb layouts placed in earlier sessions (a LayoutWorker has its own).
+    A SearchPanel rings the bulbs of the movies that match its query.
+    A HeightScale replaces the average IMDb rating as the tree height.
+    """
+    W, H = screen.get_size()
+    dirty, slider_dirty = begin_scene(screen, title_font, legend_font, slider_rect,
+                                      background_img, compositor, window_start, profiler)
+
+    if not trees:
+        return dirty
+    if not isinstance(trees, TreeCollection):
+        trees = TreeCollection(trees)
 
-    ratings = [t.avg_rating for t in trees if t.avg_rating is not None]
-    rating_min = min(ratings) if ratings else 0
-    rating_max = max(ratings) if ratings else 10
+    window_start, visible = visible_window(trees, window_start, window_size)
 
     # Layout.
     margin_x = 100
@@ -178,57 +368,163 @@ def draw_visualization(screen, trees, font, title_font, legend_font, window_star
     n = len(visible)
     spacing = area_width / max(1, (n - 1))
 
-    # Consistent colors.
-    tree_color = (0, 50, 20)
-    trunk_color = (10, 20, 10)
-    text_color = (240, 240, 240)
-
     # Draw slider.
-    draw_slider(screen, font, trees, window_start, window_size,
-                slider_rect, handle_radius)
-
-    # Draw legend (left-top).
-    legend_y = slider_rect.y + slider_rect.height + 45
-    draw_legend(screen, legend_font, x=40, y=legend_y)
+    if slider_dirty:
+        with profiler.timer("slider"):
+            draw_slider(screen, font, trees, window_start, window_size,
+                        slider_rect, handle_radius)
+            draw_range_summary(screen, font, trees.range_summary(window_start, window_size),
+                               slider_rect)
 
     # Draw all trees in this window.
     for idx, tree in enumerate(visible):
         x = int(margin_x + idx * spacing)
-        h = compute_tree_height(tree.avg_rating, rating_min, rating_max)
-
-        tree.draw(
-            surface=screen,
-            font=font,
-            x_center=x,
-            base_y=base_y,
-            tree_width=TREE_WIDTH,
-            height=h,
-            frame=frame,
-            update_period=BULB_UPDATE_PERIOD,
-            tree_color=tree_color,
-            trunk_color=trunk_color,
-            text_color=text_color,
-        )
+        h = tree_height(trees, tree, height_scale)
+
+        # Placed here so it is timed on its own; the call in Tree.draw() is then a no-op.
+        with profiler.timer("bulb placement", tree.year):
+            tree.update_bulbs(TREE_WIDTH, h, frame, BULB_UPDATE_PERIOD,
+                              BULB_LAYOUT, layout_worker, layout_cache)
+
+        with profiler.timer("tree.draw", tree.year):
+            tree.draw(
+                surface=screen,
+                font=font,
+                x_center=x,
+                base_y=base_y,
+                tree_width=TREE_WIDTH,
+                height=h,
+                frame=frame,
+                update_period=BULB_UPDATE_PERIOD,
+                tree_color=TREE_COLOR,
+                trunk_color=TRUNK_COLOR,
+                text_color=TEXT_COLOR,
+                layout=BULB_LAYOUT,
+                sprite_cache=sprite_cache,
+                bulb_atlas=bulb_atlas,
+                layout_worker=layout_worker,
+                layout_cache=layout_cache,
+                highlight=search.tree_mask(tree) if search is not None else None,
+                highlight_color=SEARCH_HIGHLIGHT_COLOR,
+            )
+
+    # Prepare trees just outside the window and free the ones far behind it.
+    if window_manager is not None:
+        with profiler.timer("prefetch"):
+            for i in window_manager.update(window_start):
+                if layout_worker is not None:
+                    h = tree_height(trees, trees[i], height_scale)
+                    trees[i].prefetch_layout(TREE_WIDTH, h, frame, BULB_UPDATE_PERIOD,
+                                             BULB_LAYOUT, layout_worker)
+
+    return dirty
+
+
+def draw_overview(screen, items, font, title_font, legend_font, window_start, window_size,
+                  slider_rect, handle_radius, background_img, compositor=None,
+                  profiler=NO_PROFILER):
+    """
+    Draw one zoomed-out frame (see lod_view.py) and return the dirty rects.
+    items is a SummaryCollection of years or decades; every summary is a
+    handful of shapes, so the cost does not grow with the number of movies.
+    """
+    W, H = screen.get_size()
+    # The slider moves in different units at each zoom level.
+    slider_key = (id(items), window_size, window_start)
+    dirty, slider_dirty = begin_scene(screen, title_font, legend_font, slider_rect,
+                                      background_img, compositor, slider_key, profiler)
+    if not items:
+        return dirty
+
+    window_start, visible = visible_window(items, window_start, window_size)
+
+    margin_x = 100
+    base_y = H - 90
+    n = len(visible)
+    spacing = (W - 2 * margin_x) / max(1, (n - 1))
+    tree_width = min(TREE_WIDTH, int(spacing * 0.75))
+
+    if slider_dirty:
+        with profiler.timer("slider"):
+            draw_slider(screen, font, items, window_start, window_size,
+                        slider_rect, handle_radius)
+
+    with profiler.timer("summary.draw"):
+        for idx, summary in enumerate(visible):
+            summary.draw(screen, font, int(margin_x + idx * spacing), base_y, tree_width,
+                         tree_height(items, summary), items.max_category_count,
+                         TREE_COLOR, TRUNK_COLOR, TEXT_COLOR)
+    return dirty
 
 
 # ====================================================
 # MAIN LOOP
 # ====================================================
 
-def main():
-    pygame.init()
-    W, H = 1400, 800
-    screen = pygame.display.set_mode((W, H))
-    pygame.display.set_caption("Christmas Movies")
+def run_in_background(function, *args):
+    """Call function(*args) on a daemon thread; returns a Future of its result."""
+    future = Future()
 
+    def run():
+        try:
+            future.set_result(function(*args))
+        except BaseException as error:
+            future.set_exception(error)
+
+    threading.Thread(target=run, name=function.__name__, daemon=True).start()
+    return future
+
+
+def open_csv_features(path):
+    """
+    Open (building them if needed) the csv cache and the side files of the
+    features that read them: {"columns": MovieColumns, "search": SearchIndex,
+    "table": MovieTable}.
+    """
+    columns = open_columns(path)
+    return {"columns": columns, "search": open_search_index(path),
+            "table": open_movie_table(path)}
+
+
+def load_fonts():
+    """Return (title_font, font, legend_font); pygame must be initialized."""
     # Title font.
     title_font = pygame.font.SysFont("Arial", 40, bold=True)
     # Normal font.
     font = pygame.font.SysFont("Arial", 20)
     # Legend font.
     legend_font = pygame.font.SysFont("Arial", 15, bold=True)
+    return title_font, font, legend_font
+
+
+def selected_mappings(movie_table, height_mode, bulb_mode, sketches=None):
+    """
+    HeightScale (None for the default) and bulb radii of the selected mappings.
+    With sketches (SketchGroups of streamed trees), height_mode picks one of
+    RATING_AGGREGATORS, which needs no movie table.
+    """
+    if sketches is not None:
+        name = list(RATING_AGGREGATORS)[height_mode]
+        height_scale = None if name == "mean" else HeightScale.for_aggregator(sketches, name)
+    else:
+        mapping = list(HEIGHT_MAPPINGS)[height_mode]
+        height_scale = (None if HEIGHT_MAPPINGS[mapping][1] is None
+                        else HeightScale.for_mapping(movie_table, mapping))
+    radii = None if movie_table is None else bulb_radii(
+        movie_table, list(BULB_SIZE_MAPPINGS)[bulb_mode])
+    return height_scale, radii
+
 
-    trees = load_trees(DATA_PATH)
+def main():
+    pygame.init()
+    W, H = 1400, 800
+    screen = pygame.display.set_mode((W, H))
+    pygame.display.set_caption("Christmas Movies")
+
+    title_font, font, legend_font = load_fonts()
+
+    loader = loader_kind(DATA_PATH)
+    trees = TreeCollection(load_trees_for(DATA_PATH))
 
     # Load background image.
     background_img = pygame.image.load("background.jpg").convert()
@@ -239,6 +535,51 @@ def main():
     slider_rect = pygame.Rect(120, 120, slider_width, 14)
     handle_radius = 10
 
+    # Background, title and legend are baked once; see scene_layers.py.
+    compositor = make_compositor(screen, title_font, legend_font, slider_rect,
+                                 handle_radius, background_img)
+    sprite_cache = TreeSpriteCache()
+    bulb_atlas = BulbSpriteAtlas()
+    # Bulb layouts for the next update period are computed in the background,
+    # or read back from the layouts saved by earlier sessions.
+    layout_cache = LayoutCache()
+    layout_worker = LayoutWorker(layout_cache=layout_cache)
+    # Keeps layout state only near the visible window.
+    window_manager = TreeWindowManager(trees, WINDOW_SIZE, sprite_cache=sprite_cache)
+    # Per-stage timings; F3 shows the overlay, F4 dumps a trace file.
+    profiler = FrameProfiler()
+    overlay_font = pygame.font.SysFont("Arial", 14)
+    # Year and decade summaries for the zoomed-out views.
+    lod_view = LodView(trees)
+    zoom = 0
+    # The csv cache and search index are opened (or built) off the render loop.
+    # Streamed csv files are never cached (that would load every movie), so
+    # they have no filter panel or search; neither has a record store.
+    csv_features = loader in ("cached", "parallel")
+    features = run_in_background(open_csv_features, DATA_PATH) if csv_features else None
+    if loader == "cached":
+        # Small csv files: ready at startup.
+        features.result()
+    # Filter panel; its index is built from the csv cache on first use.
+    filter_panel = None
+    unfiltered_trees = list(trees)
+    # Search box; its index is read from (or first written to) <csv>.search.npz.
+    search_panel = None
+    # Alternative tree height and bulb size mappings from the parsed number
+    # columns in <csv>.table.npz, opened with the csv cache. Streamed trees
+    # only change height, from their rating sketches.
+    movie_table = None
+    height_mode = bulb_mode = 0
+    height_scale = radii = None
+    # Streamed trees keep no movie detail, so their height aggregators come
+    # from the rating sketches instead of the movie table.
+    sketches = SketchGroups.from_trees(trees) if loader == "streaming" else None
+    # Changes to the csv are read in the background and patched into the trees.
+    # Streamed trees read their movies back by record offset, which a rewrite can move.
+    # A record store is not watched: it only grows through record_store.py appends.
+    csv_watcher = (None if loader == "records"
+                   else CsvWatcher(DATA_PATH, track_offsets=loader == "streaming"))
+
     window_start = 0
     dragging_slider = False
 
@@ -247,44 +588,187 @@ def main():
     running = True
 
     while running:
+        profiler.begin_frame(frame)
+        items, window_size, detail = lod_view.level(zoom)
 
         # ----------------------------------------
         # 1. EVENT HANDLING
         # ----------------------------------------
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+        with profiler.timer("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+
+                # While the search box is open, keys edit the query.
+                elif event.type == pygame.KEYDOWN and search_panel and search_panel.active:
+                    with profiler.timer("search"):
+                        search_panel.handle_key(event)
+
+                elif event.type == pygame.KEYDOWN and event.key in (HEIGHT_MAPPING_KEY,
+                                                                     BULB_SIZE_KEY):
+                    if movie_table is None and features is not None and features.done():
+                        movie_table = features.result()["table"]
+                    changed = True
+                    if sketches is not None and event.key == HEIGHT_MAPPING_KEY:
+                        height_mode = (height_mode + 1) % len(RATING_AGGREGATORS)
+                    elif movie_table is None:
+                        # Streamed trees have no table; otherwise it is not open yet.
+                        changed = False
+                    elif event.key == HEIGHT_MAPPING_KEY:
+                        height_mode = (height_mode + 1) % len(HEIGHT_MAPPINGS)
+                    else:
+                        bulb_mode = (bulb_mode + 1) % len(BULB_SIZE_MAPPINGS)
+                    if changed:
+                        height_scale, radii = selected_mappings(movie_table, height_mode,
+                                                                bulb_mode, sketches)
+                        if event.key == BULB_SIZE_KEY:
+                            apply_bulb_radii(trees, movie_table, radii)
+
+                elif event.type == pygame.KEYDOWN and event.key == SEARCH_KEY:
+                    # Until the index is ready, / does nothing.
+                    if search_panel is None and features is not None and features.done():
+                        ready = features.result()
+                        search_panel = SearchPanel(ready["search"], ready["columns"],
+                                                   overlay_font,
+                                                   (40, compositor.tree_area.top + 100))
+                    if search_panel is not None:
+                        search_panel.open()
+
+                elif event.type == pygame.KEYDOWN and event.key == PROFILER_OVERLAY_KEY:
+                    profiler.toggle_overlay()
+                    # Repaint everything so the hidden overlay leaves nothing behind.
+                    compositor.invalidate()
+
+                elif event.type == pygame.KEYDOWN and event.key == PROFILER_DUMP_KEY:
+                    print("Frame trace written to", profiler.dump_trace())
+
+                elif event.type == pygame.KEYDOWN and event.key == FILTER_PANEL_KEY:
+                    # Until the csv cache is open, F does nothing.
+                    if filter_panel is None and features is not None and features.done():
+                        filter_panel = FilterPanel(FilterIndex(features.result()["columns"]),
+                                                   overlay_font,
+                                                   (300, compositor.tree_area.top + 10))
+                    if filter_panel is not None:
+                        filter_panel.toggle()
+                        compositor.invalidate()
+
+                # Keyboard (-/+) and mouse wheel change the zoom level.
+                elif event.type in (pygame.KEYDOWN, pygame.MOUSEWHEEL):
+                    if event.type == pygame.MOUSEWHEEL:
+                        step = -1 if event.y > 0 else 1
+                    else:
+                        step = (1 if event.key in ZOOM_OUT_KEYS
+                                else -1 if event.key in ZOOM_IN_KEYS else 0)
+                    new_zoom = max(0, min(zoom + step, len(ZOOM_LEVELS) - 1))
+                    if new_zoom != zoom:
+                        window_start = lod_view.convert_start(zoom, new_zoom, window_start)
+                        zoom = new_zoom
+                        compositor.invalidate()
             
-            # Mouse controls slider.
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = event.pos
-                if slider_rect.inflate(0, 20).collidepoint(mx, my):
-                    dragging_slider = True
+                # Mouse controls slider.
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button in (1, 2, 3):
+                    mx, my = event.pos
+                    clicked = filter_panel and filter_panel.handle_click(event.pos)
+                    if clicked == "changed":
+                        with profiler.timer("filter"):
+                            filter_panel.apply(trees, unfiltered_trees)
+                            lod_view.rebuild()
+                            if movie_table is not None:
+                                apply_bulb_radii(trees, movie_table, radii)
+                        compositor.invalidate()
+                    elif not clicked and slider_rect.inflate(0, 20).collidepoint(mx, my):
+                        dragging_slider = True
+                        window_start = slider_value_from_mouse(
+                            mx, items, window_size, slider_rect
+                        )
+
+                elif event.type == pygame.MOUSEBUTTONUP:
+                    dragging_slider = False
+
+                elif event.type == pygame.MOUSEMOTION and dragging_slider:
+                    mx, my = event.pos
                     window_start = slider_value_from_mouse(
-                        mx, trees, WINDOW_SIZE, slider_rect
+                        mx, items, window_size, slider_rect
                     )
 
-            elif event.type == pygame.MOUSEBUTTONUP:
-                dragging_slider = False
-
-            elif event.type == pygame.MOUSEMOTION and dragging_slider:
-                mx, my = event.pos
-                window_start = slider_value_from_mouse(
-                    mx, trees, WINDOW_SIZE, slider_rect
-                )
+        # Patch the trees of years that changed in the csv.
+        update = csv_watcher and csv_watcher.poll()
+        if update is not None:
+            with profiler.timer("reload"):
+                if filter_panel is not None:
+                    # Put the unfiltered trees back; the filter index is rebuilt on next use.
+                    filter_panel.filter.clear()
+                    filter_panel.apply(trees, unfiltered_trees)
+                    filter_panel = None
+                patch_trees(trees, update, window_manager)
+                unfiltered_trees = list(trees)
+                lod_view.rebuild()
+                if sketches is not None:
+                    sketches = SketchGroups.from_trees(trees)
+                    if height_scale is not None:
+                        height_scale, _ = selected_mappings(None, height_mode, 0, sketches)
+                items, window_size, detail = lod_view.level(zoom)
+                window_start = max(0, min(window_start, len(items) - window_size))
+                # Indexes of the old csv are read again.
+                search_panel = None
+                if csv_features:
+                    features = run_in_background(open_csv_features, DATA_PATH)
+                if movie_table is not None:
+                    # Default mappings until the new table is open (see below).
+                    movie_table = None
+                    height_scale = radii = None
+                    apply_bulb_radii(trees, None, None)
+            compositor.invalidate()
+
+        # A movie table opened after a reload brings the selected mappings back.
+        if (movie_table is None and sketches is None and (height_mode or bulb_mode)
+                and features is not None and features.done()):
+            movie_table = features.result()["table"]
+            height_scale, radii = selected_mappings(movie_table, height_mode, bulb_mode)
+            apply_bulb_radii(trees, movie_table, radii)
+            compositor.invalidate()
 
         # ----------------------------------------
         # 2. DRAWING
         # ----------------------------------------        
-        draw_visualization(
-            screen, trees, font, title_font, legend_font, window_start, WINDOW_SIZE,
-            frame, slider_rect, handle_radius, background_img
-        )
-
-        pygame.display.flip()
+        items, window_size, detail = lod_view.level(zoom)
+        if detail == "tree":
+            dirty = draw_visualization(
+                screen, trees, font, title_font, legend_font, window_start, window_size,
+                frame, slider_rect, handle_radius, background_img, compositor,
+                sprite_cache, bulb_atlas, layout_worker, window_manager, profiler,
+                search=search_panel, height_scale=height_scale
+            )
+        else:
+            dirty = draw_overview(
+                screen, items, font, title_font, legend_font, window_start, window_size,
+                slider_rect, handle_radius, background_img, compositor, profiler
+            )
+        # The overlay sits in the tree area, which is redrawn every frame.
+        overlay_rect = profiler.draw_overlay(screen, overlay_font,
+                                             (W - 10, compositor.tree_area.top + 10))
+        if overlay_rect is not None:
+            dirty.append(overlay_rect)
+        panel_rect = filter_panel and filter_panel.draw(screen)
+        if panel_rect:
+            dirty.append(panel_rect)
+        search_rect = search_panel and search_panel.draw(screen)
+        if search_rect:
+            dirty.append(search_rect)
+        if detail == "tree" and (height_mode or bulb_mode):
+            height_label = HEIGHT_MAPPINGS["imdb"][0] if height_scale is None else height_scale.label
+            label = (f"Tree height: {height_label}   "
+                     f"Bulb size: {list(BULB_SIZE_MAPPINGS.values())[bulb_mode][0]}")
+            text = TEXT_CACHE.render(overlay_font, label, TEXT_COLOR)
+            dirty.append(screen.blit(text, text.get_rect(bottomright=(W - 10, H - 6))))
+
+        with profiler.timer("display.update"):
+            pygame.display.update(dirty)
         clock.tick(25)
         frame += 1
 
+    layout_worker.shutdown()
+    layout_cache.close()
     pygame.quit()
 
 
@@ -0,0 +1,96 @@
+"""
+This file measures bulb memory for one synthetic tree with many movies:
+the old layout (a new Bulb object with a __dict__ per movie every update
+period) against the array-backed BulbStore that is updated in place.
+
+Example:
+    python bench_bulb_memory.py --movies 100000 --updates 5
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from visual_objects import BulbStore, rating_category_index
+
+RATINGS = ["G", "PG", "PG-13", "R", "TV-MA", "Not Rated", None]
+
+
+class DictBulb:
+    """The Bulb class as it was before BulbStore: one __dict__ per instance."""
+
+    def __init__(self, x, y, rating_cat):
+        self.x = x
+        self.y = y
+        self.rating_cat = rating_cat
+        self.base_radius = 5
+
+
+def measure(label, update, updates):
+    """
+    Run update() several times and report the memory a tree keeps (live),
+    the peak while re-laying out, and how many garbage collections the
+    allocations triggered.
+    """
+    gc.collect()
+    tracemalloc.start()
+    kept = update()  # First layout: the memory a tree holds on to.
+    live, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    collections = sum(stat["collections"] for stat in gc.get_stats())
+    start = time.perf_counter()
+    for _ in range(updates):
+        kept = update()
+    elapsed = (time.perf_counter() - start) / updates
+    collections = sum(stat["collections"] for stat in gc.get_stats()) - collections
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    print(f"{label:<12}{live / 1e6:>10.2f}{peak / 1e6:>10.2f}"
+          f"{collections / updates:>14.1f}{elapsed * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=100000)
+    parser.add_argument("--updates", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    movies = [{"rating_cat": rng.choice(RATINGS)} for _ in range(args.movies)]
+    for movie in movies:
+        movie["category"] = rating_category_index(movie["rating_cat"])
+    categories = np.array([m["category"] for m in movies], dtype=np.uint8)
+
+    def positions():
+        return list(zip(np.random.randint(0, 1400, args.movies).tolist(),
+                        np.random.randint(0, 800, args.movies).tolist()))
+
+    layouts = [positions() for _ in range(args.updates + 1)]
+
+    def old_update():
+        pos = layouts[0]
+        return [DictBulb(px, py, m["rating_cat"]) for (px, py), m in zip(pos, movies)]
+
+    store = BulbStore()
+
+    def store_update():
+        store.set_layout(layouts[0], categories)
+        return store
+
+    print(f"{args.movies} bulbs, {args.updates} layout updates")
+    print("(times include tracemalloc overhead)")
+    print(f"{'storage':<12}{'live MB':>10}{'peak MB':>10}{'GC runs/upd':>14}{'ms/upd':>10}")
+    measure("Bulb list", old_update, args.updates)
+    measure("BulbStore", store_update, args.updates)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+This file benchmarks csv ingestion: the single-threaded load_trees() parser
+against load_trees_parallel() with a growing number of worker processes.
+
+Example:
+    python bench_ingest.py --years 90 --movies-per-year 5000 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from BAI_data_art import load_trees
+from movie_stream import load_trees_parallel
+from synthetic_movies import write_synthetic_csv
+
+
+def best_time(func, repeat):
+    """Return the fastest of repeat runs, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", help="Existing csv to load instead of a synthetic one.")
+    parser.add_argument("--years", type=int, default=90)
+    parser.add_argument("--movies-per-year", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            path = os.path.join(tmp, "synthetic_movies.csv")
+            rows = write_synthetic_csv(path, args.years, args.movies_per_year)
+            print(f"Synthetic csv: {rows} rows, {os.path.getsize(path) / 1e6:.1f} MB")
+
+        baseline = best_time(lambda: load_trees(path, use_cache=False), args.repeat)
+        print(f"{'loader':<22}{'seconds':>10}{'speedup':>10}")
+        print(f"{'load_trees (1 proc)':<22}{baseline:>10.3f}{1.0:>10.2f}")
+        for workers in args.workers:
+            elapsed = best_time(lambda: load_trees_parallel(path, workers), args.repeat)
+            label = f"parallel x{workers}"
+            print(f"{label:<22}{elapsed:>10.3f}{baseline / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
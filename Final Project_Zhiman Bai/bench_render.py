@@ -0,0 +1,163 @@
+"""
+This file is a headless frame-time benchmark for draw_visualization().
+It runs with the SDL dummy video driver, renders frames over a synthetic csv
+while sweeping window_start back and forth like the slider, and writes
+p50/p95/p99 frame times for the load, layout and draw phases as JSON.
+
+Phases of each frame:
+    load:   per-movie detail of the visible trees (lazy cache / stream reads).
+    layout: Tree.update_bulbs() for the visible trees.
+    draw:   draw_visualization() with the layouts already in place.
+
+Example:
+    python bench_render.py --years 90 --movies-per-year 200 --frames 600 --out bench.json
+"""
+
+import os
+
+# Must be set before pygame opens a display.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import random
+import tempfile
+import time
+
+import numpy as np
+import pygame
+
+import BAI_data_art as art
+from synthetic_movies import write_synthetic_csv
+from tree_collection import TreeCollection
+from visual_objects import TEXT_CACHE, BulbSpriteAtlas, TreeSpriteCache
+
+SCREEN_SIZE = (1400, 800)
+
+
+def sweep_positions(num_trees, window_size, frames, frames_per_step):
+    """Window starts for each frame, dragging from one end to the other and back."""
+    max_start = max(0, num_trees - window_size)
+    if max_start == 0:
+        return [0] * frames
+    cycle = list(range(max_start + 1)) + list(range(max_start - 1, 0, -1))
+    return [cycle[(f // frames_per_step) % len(cycle)] for f in range(frames)]
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean/max of a list of seconds, in milliseconds."""
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+        "mean": round(float(ms.mean()), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+def run_benchmark(csv_path, frames, window_size, frames_per_step, fast, seed=0):
+    """Render frames headlessly and return the timing report as a dict."""
+    random.seed(seed)
+    np.random.seed(seed)
+
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    title_font, font, legend_font = art.load_fonts()
+    background_img = pygame.Surface(SCREEN_SIZE).convert()
+    background_img.fill((40, 120, 60))
+    slider_rect = pygame.Rect(120, 120, SCREEN_SIZE[0] - 240, 14)
+    handle_radius = 10
+
+    start = time.perf_counter()
+    trees = TreeCollection(art.load_trees_for(csv_path))
+    dataset_load = time.perf_counter() - start
+
+    compositor = sprite_cache = bulb_atlas = None
+    if fast:
+        compositor = art.make_compositor(screen, title_font, legend_font, slider_rect,
+                                         handle_radius, background_img)
+        sprite_cache = TreeSpriteCache()
+        bulb_atlas = BulbSpriteAtlas()
+
+    phases = {"load": [], "layout": [], "draw": [], "total": []}
+    for frame, window_start in enumerate(
+            sweep_positions(len(trees), window_size, frames, frames_per_step)):
+        _, visible = art.visible_window(trees, window_start, window_size)
+
+        t0 = time.perf_counter()
+        for tree in visible:
+            tree.bulb_categories()  # Forces lazy movie detail to load.
+        t1 = time.perf_counter()
+        for tree in visible:
+            tree.update_bulbs(art.TREE_WIDTH, art.tree_height(trees, tree), frame,
+                              art.BULB_UPDATE_PERIOD, art.BULB_LAYOUT)
+        t2 = time.perf_counter()
+        dirty = art.draw_visualization(
+            screen, trees, font, title_font, legend_font, window_start, window_size,
+            frame, slider_rect, handle_radius, background_img, compositor,
+            sprite_cache, bulb_atlas
+        )
+        pygame.display.update(dirty)
+        t3 = time.perf_counter()
+
+        phases["load"].append(t1 - t0)
+        phases["layout"].append(t2 - t1)
+        phases["draw"].append(t3 - t2)
+        phases["total"].append(t3 - t0)
+
+    pygame.quit()
+    return {
+        "dataset_load_seconds": round(dataset_load, 4),
+        "trees": len(trees),
+        "movies": trees.movie_count,
+        "frames_ms": {name: percentiles(samples) for name, samples in phases.items()},
+        "text_cache": {"hits": TEXT_CACHE.hits, "misses": TEXT_CACHE.misses},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", help="Existing csv to render instead of a synthetic one.")
+    parser.add_argument("--years", type=int, default=90)
+    parser.add_argument("--movies-per-year", type=int, default=100)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--window-size", type=int, default=art.WINDOW_SIZE)
+    parser.add_argument("--frames-per-step", type=int, default=3,
+                        help="Frames between one-tree slider steps.")
+    parser.add_argument("--baseline", action="store_true",
+                        help="Full redraw without compositor, sprite cache or bulb atlas.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the JSON report here (default: stdout).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = args.csv
+        if csv_path is None:
+            csv_path = os.path.join(tmp, "synthetic_movies.csv")
+            write_synthetic_csv(csv_path, args.years, args.movies_per_year, seed=args.seed)
+
+        report = run_benchmark(csv_path, args.frames, args.window_size,
+                               args.frames_per_step, fast=not args.baseline, seed=args.seed)
+
+    report["config"] = {
+        "csv": args.csv or f"synthetic {args.years} x {args.movies_per_year}",
+        "frames": args.frames,
+        "window_size": args.window_size,
+        "frames_per_step": args.frames_per_step,
+        "mode": "baseline" if args.baseline else "fast",
+        "bulb_layout": art.BULB_LAYOUT,
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
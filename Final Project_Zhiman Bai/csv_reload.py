@@ -0,0 +1,259 @@
+"""
+This file defines CsvWatcher, which picks up changes to the csv while the
+visualization runs, so a catalog refresh does not need a restart.
+
+The main loop calls poll() once per frame. It only calls os.stat() every
+POLL_INTERVAL seconds, and a change is read once the size and mtime have
+stayed the same for one more poll (the writer is done). Reading happens on a
+background thread, which parses the csv in batches and remembers only a hash
+of each year's records:
+    appended rows (the bytes read last time are unchanged): the new rows tell
+        which years changed, and only those years' movies are kept while the
+        rest of the file is parsed again.
+    other changes: every year is hashed again, and only the years whose
+        hash changed (or that appeared or disappeared) are reported. Records
+        of the other years may have moved, so with track_offsets (trees of the
+        streaming loader) the new record offsets of every year are reported too.
+The result is a CsvUpdate, applied on the main thread with patch_trees().
+"""
+
+import array
+import hashlib
+import os
+import queue
+import threading
+import time
+
+from movie_records import iter_raw_records, movie_dict, parse_raw_records, read_header
+from movie_stream import CHUNK_ROWS, StreamedMovies
+from rating_aggregators import RatingSketch
+from visual_objects import Tree
+
+POLL_INTERVAL = 1.0  # Seconds between os.stat() calls.
+
+
+class CsvUpdate:
+    """
+    New data of the years that changed: year -> (avg_rating, movies,
+    total_votes, RatingSketch, rated movies), or None for a year that no longer has movies.
+    After a full rescan by a watcher with track_offsets, offsets maps every
+    year to the byte offsets of its records (see movie_stream.YearAggregate)
+    and fieldnames is the csv header; otherwise both are None.
+    """
+
+    def __init__(self, years, offsets=None, fieldnames=None):
+        self.years = years
+        self.offsets = offsets
+        self.fieldnames = fieldnames
+
+    def __len__(self):
+        return len(self.years)
+
+
+def aggregate_year(parsed):
+    """
+    (avg_rating, movie dicts, total votes, RatingSketch, rated movies) of one
+    year's parse_raw_records() tuples.
+    """
+    ratings = [imdb for _, imdb, _, _, _ in parsed if imdb is not None]
+    movies = [movie_dict(title, imdb, rating_cat) for _, imdb, rating_cat, title, _ in parsed]
+    votes = sum(v or 0 for _, _, _, _, v in parsed)
+    sketch = RatingSketch()
+    for _, imdb, _, _, v in parsed:
+        sketch.add(imdb, v)
+    avg = sum(ratings) / len(ratings) if ratings else None
+    return avg, movies, votes, sketch, len(ratings)
+
+
+def _hash_prefix(f, n, block_size=1 << 20):
+    """sha1 digest of the first n bytes of a binary file."""
+    digest = hashlib.sha1()
+    f.seek(0)
+    while n > 0:
+        block = f.read(min(block_size, n))
+        if not block:
+            break
+        digest.update(block)
+        n -= len(block)
+    return digest.digest()
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class CsvWatcher:
+    def __init__(self, path, poll_interval=POLL_INTERVAL, track_offsets=False):
+        """
+        track_offsets: report the record offsets of every year after a full
+        rescan, for trees that read their movies back by offset (StreamedMovies).
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.track_offsets = track_offsets
+        self._stat = _stat_key(path)  # Stat of the csv as last read.
+        self._pending = None  # Stat seen on the previous poll, while it differs.
+        self._next_poll = 0.0
+        self._results = queue.Queue()
+        self._thread = None
+        # Filled by the scans (background thread only).
+        self._fieldnames = None
+        self._hashes = {}  # Year -> sha1 of its records' bytes, in file order.
+        self._end = 0  # Bytes of the csv already scanned.
+        self._digest = None  # sha1 of those bytes, to tell an append from an edit.
+        self._complete = False  # Whether those bytes end with a whole record.
+        # The first scan only learns the current file; the trees already show it.
+        self._start_scan(report=False)
+
+    def _start_scan(self, report=True):
+        self._thread = threading.Thread(target=self._scan, args=(report,),
+                                        name="csv-reload", daemon=True)
+        self._thread.start()
+
+    def poll(self, now=None):
+        """Return a CsvUpdate when a finished scan found changed years, else None."""
+        now = time.monotonic() if now is None else now
+        if now >= self._next_poll and not self._thread.is_alive():
+            self._next_poll = now + self.poll_interval
+            stat = _stat_key(self.path)
+            if stat is not None and stat != self._stat:
+                if stat == self._pending:
+                    self._stat = stat
+                    self._pending = None
+                    self._start_scan()
+                else:
+                    self._pending = stat
+        try:
+            update = self._results.get_nowait()
+        except queue.Empty:
+            return None
+        return update if len(update) or update.offsets is not None else None
+
+    # ----------------------------------------
+    # Background scan
+    # ----------------------------------------
+
+    def _parse_years(self, f, hashes, wanted=None, end=None, offsets=None):
+        """
+        Parse the records from the current position of f (up to end) in
+        batches, adding each record's bytes to the sha1 of its year in hashes
+        (and its offset to the year's array in offsets, if given).
+        Returns {year: parse_raw_records() tuples} of the wanted years (every
+        year if wanted is None) and the offset after the last record.
+        """
+        parsed = {}
+        stop = f.tell()
+
+        def consume(batch, starts):
+            for movie in parse_raw_records(self._fieldnames, batch, with_votes=True,
+                                           with_index=True):
+                year, i = movie[0], movie[-1]
+                hashes.setdefault(year, hashlib.sha1()).update(batch[i])
+                if offsets is not None:
+                    offsets.setdefault(year, array.array("q")).append(starts[i])
+                if wanted is None or year in wanted:
+                    parsed.setdefault(year, []).append(movie[:-1])
+
+        batch, starts = [], []
+        for offset, raw in iter_raw_records(f, end):
+            batch.append(raw)
+            starts.append(offset)
+            stop = offset + len(raw)
+            if len(batch) == CHUNK_ROWS:
+                consume(batch, starts)
+                batch, starts = [], []
+        if batch:
+            consume(batch, starts)
+        return parsed, stop
+
+    def _scan(self, report):
+        with open(self.path, "rb") as f:
+            fieldnames = read_header(f)
+            body = f.tell()
+            size = os.fstat(f.fileno()).st_size
+            old_end = self._end
+            appended = (report and self._complete and fieldnames == self._fieldnames
+                        and size >= old_end and _hash_prefix(f, old_end) == self._digest)
+            self._fieldnames = fieldnames
+
+            if appended:
+                # The year hashes carry on with the new records.
+                f.seek(old_end)
+                parsed, self._end = self._parse_years(f, self._hashes)
+                changed = set(parsed)
+                if changed:
+                    # The earlier movies of those years come first.
+                    f.seek(body)
+                    before, _ = self._parse_years(f, {}, changed, old_end)
+                    parsed = {year: before.get(year, []) + movies
+                              for year, movies in parsed.items()}
+                offsets = None
+            else:
+                f.seek(body)
+                hashes = {}
+                offsets = {} if report and self.track_offsets else None
+                parsed, end = self._parse_years(f, hashes, None if report else set(),
+                                                offsets=offsets)
+                self._end = max(end, body)
+                old = self._hashes
+                changed = {year for year in set(old) | set(hashes)
+                           if year not in old or year not in hashes
+                           or old[year].digest() != hashes[year].digest()}
+                self._hashes = hashes
+            self._digest = _hash_prefix(f, self._end)
+            f.seek(self._end - 1)
+            # Rows written after a last line without a newline would join it.
+            self._complete = self._end == body or f.read(1) == b"\n"
+        if not report:
+            return
+
+        years = {}
+        for year in sorted(changed):
+            years[year] = aggregate_year(parsed[year]) if year in parsed else None
+        self._results.put(CsvUpdate(years, offsets,
+                                    self._fieldnames if offsets is not None else None))
+
+
+# ====================================================
+# APPLY AN UPDATE
+# ====================================================
+
+def patch_trees(trees, update, window_manager=None):
+    """
+    Apply a CsvUpdate to a TreeCollection: changed years are updated in place,
+    new years get a tree and years without movies lose theirs. Streamed trees
+    of the other years are pointed at their records' new offsets.
+    Returns True if trees were inserted or removed (indexes shifted).
+    """
+    reshaped = any((trees.index_of_year(year) is None) != (data is None)
+                   for year, data in update.years.items())
+    if reshaped and window_manager is not None:
+        # Resident trees are tracked by index, which is about to shift.
+        window_manager.reset()
+    seed = trees[0].seed if len(trees) else 0
+    for year, data in update.years.items():
+        i = trees.index_of_year(year)
+        if data is None:
+            if i is not None:
+                trees.remove(i).release_layout()
+        elif i is None:
+            avg, movies, votes, sketch, rated = data
+            tree = Tree(year, avg, movies, total_votes=votes, rated_count=rated)
+            tree.seed = seed
+            tree.rating_sketch = sketch
+            trees.add(tree)
+        else:
+            avg, movies, votes, sketch, rated = data
+            trees.update(i, avg, movies, total_votes=votes, rated_count=rated)
+            trees[i].rating_sketch = sketch
+    if update.offsets is not None:
+        # Records of the unchanged years may have moved in the file.
+        for tree in trees:
+            if isinstance(tree.movies, StreamedMovies):
+                tree.movies.move_records(update.offsets.get(tree.year, array.array("q")),
+                                         update.fieldnames)
+    return reshaped
@@ -0,0 +1,160 @@
+"""
+This file renders the visualization to a numbered PNG sequence without a window.
+Every slider position is rendered for a number of bulb update periods, and the
+frames are split across a process pool; each worker owns its own pygame surface.
+
+The output only depends on the csv and --seed: bulb layouts and sparkles are
+seeded per tree from (seed, year, period) (see Tree.layout_seed()), so a frame
+looks the same whichever worker renders it and in whatever order. Layouts are
+shared through the on-disk LayoutCache, so later exports skip bulb placement.
+
+Example:
+    python export_frames.py --out-dir frames --periods 3 --workers 4
+    ffmpeg -framerate 8 -i frames/frame_%05d.png movies.mp4
+"""
+
+import os
+
+# Must be set before pygame opens a display.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+import BAI_data_art as art
+from layout_cache import LAYOUT_CACHE_PATH, LayoutCache
+from tree_collection import TreeCollection
+from visual_objects import BulbSpriteAtlas, TreeSpriteCache
+
+SCREEN_SIZE = (1400, 800)
+FRAME_NAME = "frame_{:05d}.png"
+
+# Per-process render state, set up once by _init_worker().
+_worker = {}
+
+
+# ====================================================
+# WORKER PROCESS
+# ====================================================
+
+def _init_worker(csv_path, background_path, seed, layout_cache_path):
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    title_font, font, legend_font = art.load_fonts()
+
+    if background_path and os.path.exists(background_path):
+        background_img = pygame.image.load(background_path).convert()
+        background_img = pygame.transform.scale(background_img, SCREEN_SIZE)
+    else:
+        background_img = pygame.Surface(SCREEN_SIZE).convert()
+        background_img.fill((40, 120, 60))
+
+    trees = TreeCollection(art.load_trees_for(csv_path))
+    for tree in trees:
+        tree.seed = seed
+
+    _worker.update(
+        screen=screen,
+        fonts=(title_font, font, legend_font),
+        background_img=background_img,
+        trees=trees,
+        layout_cache=LayoutCache(layout_cache_path),
+        slider_rect=pygame.Rect(120, 120, SCREEN_SIZE[0] - 240, 14),
+        sprite_cache=TreeSpriteCache(),
+        bulb_atlas=BulbSpriteAtlas(),
+    )
+
+
+def render_window(window_start, window_size, periods, out_dir):
+    """
+    Render every bulb update period of one slider position.
+    Returns the paths of the frames written.
+    """
+    w = _worker
+    trees = w["trees"]
+    title_font, font, legend_font = w["fonts"]
+    _, visible = art.visible_window(trees, window_start, window_size)
+
+    paths = []
+    for period in range(periods):
+        frame = period * art.BULB_UPDATE_PERIOD
+        # Start every frame from a freshly shown layout, so the sparkles do not
+        # depend on which frames this worker happened to draw before.
+        for tree in visible:
+            tree.release_layout()
+
+        art.draw_visualization(
+            w["screen"], trees, font, title_font, legend_font, window_start, window_size,
+            frame, w["slider_rect"], 10, w["background_img"],
+            sprite_cache=w["sprite_cache"], bulb_atlas=w["bulb_atlas"],
+            layout_cache=w["layout_cache"]
+        )
+
+        path = os.path.join(out_dir, FRAME_NAME.format(window_start * periods + period))
+        pygame.image.save(w["screen"], path)
+        paths.append(path)
+
+    # Keep worker memory flat over a long export.
+    for tree in visible:
+        tree.release_layout()
+        tree.release_movies()
+    w["layout_cache"].flush()
+    return paths
+
+
+# ====================================================
+# EXPORT
+# ====================================================
+
+def export_frames(csv_path, out_dir, periods=2, window_size=art.WINDOW_SIZE, seed=0,
+                  workers=None, background_path="background.jpg",
+                  layout_cache_path=LAYOUT_CACHE_PATH):
+    """
+    Render every slider position for `periods` bulb update periods into out_dir.
+    One task per slider position keeps each worker's sprite caches warm.
+    Returns the number of frames written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    # Loading once here also builds the csv cache before the workers open it,
+    # and the layout cache is created before they share it.
+    num_trees = len(art.load_trees_for(csv_path))
+    LayoutCache(layout_cache_path).close()
+    positions = range(max(1, num_trees - window_size + 1))
+
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(csv_path, background_path, seed,
+                                       layout_cache_path)) as pool:
+        futures = [pool.submit(render_window, start, window_size, periods, out_dir)
+                   for start in positions]
+        for future in futures:
+            written += len(future.result())
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=art.DATA_PATH)
+    parser.add_argument("--out-dir", default="frames")
+    parser.add_argument("--periods", type=int, default=2,
+                        help="Bulb update periods rendered per slider position.")
+    parser.add_argument("--window-size", type=int, default=art.WINDOW_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one per CPU).")
+    parser.add_argument("--background", default="background.jpg")
+    parser.add_argument("--layout-cache", default=LAYOUT_CACHE_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = export_frames(args.csv, args.out_dir, args.periods, args.window_size,
+                          args.seed, args.workers, args.background, args.layout_cache)
+    print(f"wrote {count} frames to {args.out_dir} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
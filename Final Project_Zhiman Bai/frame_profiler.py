@@ -0,0 +1,204 @@
+"""
+This file defines FrameProfiler, which records how long each stage of a frame
+takes (event handling, background, slider, each tree, bulb placement, display
+update) into a fixed-size ring buffer.
+
+The recent samples can be shown as an on-screen table of rolling percentiles,
+or dumped as a Chrome trace-event JSON file (open it in chrome://tracing or
+https://ui.perfetto.dev).
+"""
+
+import contextlib
+import json
+import time
+
+import numpy as np
+import pygame
+
+RING_CAPACITY = 16384  # Samples kept; about 500 frames with ten trees on screen.
+OVERLAY_FRAMES = 120  # Frames the overlay percentiles are computed over.
+OVERLAY_REFRESH = 10  # Frames between overlay text updates.
+
+
+class _StageTimer:
+    """Reusable context manager that times one stage into a FrameProfiler."""
+
+    __slots__ = ("profiler", "stage_id", "detail", "start")
+
+    def __init__(self, profiler, stage_id):
+        self.profiler = profiler
+        self.stage_id = stage_id
+        self.detail = -1
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.stage_id, self.start,
+                             time.perf_counter_ns() - self.start, self.detail)
+        return False
+
+
+class FrameProfiler:
+    def __init__(self, capacity=RING_CAPACITY):
+        # Preallocated columns; record() only writes into them.
+        self.capacity = capacity
+        self.stage = np.zeros(capacity, dtype=np.uint16)
+        self.start_ns = np.zeros(capacity, dtype=np.int64)
+        self.duration_ns = np.zeros(capacity, dtype=np.int64)
+        self.frame = np.zeros(capacity, dtype=np.int32)
+        self.detail = np.zeros(capacity, dtype=np.int32)  # e.g. the year of a tree.
+        self.size = 0
+        self.head = 0  # Next slot to write.
+
+        self.stage_names = []
+        self._timers = {}
+        self.current_frame = 0
+        self.origin_ns = time.perf_counter_ns()
+
+        self.overlay_visible = False
+        self._overlay_surface = None
+        self._overlay_frame = None
+
+    def begin_frame(self, frame):
+        self.current_frame = frame
+
+    def timer(self, name, detail=-1):
+        """
+        Return a context manager that records the time spent in its block.
+        detail is an int attached to the sample (shown in the trace event name).
+        """
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers[name] = _StageTimer(self, len(self.stage_names))
+            self.stage_names.append(name)
+        timer.detail = detail
+        return timer
+
+    def record(self, stage_id, start_ns, duration_ns, detail=-1):
+        i = self.head
+        self.stage[i] = stage_id
+        self.start_ns[i] = start_ns
+        self.duration_ns[i] = duration_ns
+        self.frame[i] = self.current_frame
+        self.detail[i] = detail
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _ordered(self):
+        """Indexes of the buffered samples, oldest first."""
+        if self.size < self.capacity:
+            return np.arange(self.size)
+        return (np.arange(self.capacity) + self.head) % self.capacity
+
+    # ====================================================
+    # ROLLING PERCENTILES
+    # ====================================================
+
+    def percentiles(self, frames=OVERLAY_FRAMES):
+        """
+        Return {stage name: (p50, p95, p99, samples)} in milliseconds over the
+        last `frames` frames. A stage timed several times per frame (one per
+        tree) is summed per frame first, so the numbers are per-frame costs.
+        """
+        order = self._ordered()
+        if len(order) == 0:
+            return {}
+        recent = order[self.frame[order] > self.current_frame - frames]
+        stats = {}
+        for stage_id, name in enumerate(self.stage_names):
+            rows = recent[self.stage[recent] == stage_id]
+            if len(rows) == 0:
+                continue
+            _, inverse = np.unique(self.frame[rows], return_inverse=True)
+            per_frame = np.bincount(inverse, weights=self.duration_ns[rows]) / 1e6
+            p50, p95, p99 = np.percentile(per_frame, (50, 95, 99))
+            stats[name] = (p50, p95, p99, len(per_frame))
+        return stats
+
+    # ====================================================
+    # OVERLAY
+    # ====================================================
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self._overlay_surface = None
+
+    def draw_overlay(self, surface, font, topright):
+        """Draw the percentile table; returns its rect, or None when hidden."""
+        if not self.overlay_visible:
+            return None
+        stale = (self._overlay_frame is None
+                 or self.current_frame - self._overlay_frame >= OVERLAY_REFRESH)
+        if self._overlay_surface is None or stale:
+            self._overlay_surface = self._render_overlay(font)
+            self._overlay_frame = self.current_frame
+        rect = self._overlay_surface.get_rect(topright=topright)
+        surface.blit(self._overlay_surface, rect)
+        return rect
+
+    def _render_overlay(self, font):
+        rows = [("stage (ms)", "p50", "p95", "p99")]
+        for name, (p50, p95, p99, _) in self.percentiles().items():
+            rows.append((name, f"{p50:.2f}", f"{p95:.2f}", f"{p99:.2f}"))
+        cells = [[font.render(text, True, (255, 255, 255)) for text in row] for row in rows]
+
+        # Cell by cell, so the columns line up without a monospace font.
+        pad = 8
+        name_w = max(row[0].get_width() for row in cells) + pad
+        num_w = max(c.get_width() for row in cells for c in row[1:]) + pad
+        line_h = font.get_linesize()
+        panel = pygame.Surface((name_w + 3 * num_w + 2 * pad, line_h * len(cells) + pad),
+                               pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for i, row in enumerate(cells):
+            y = pad // 2 + i * line_h
+            panel.blit(row[0], (pad, y))
+            for j, cell in enumerate(row[1:]):
+                right = pad + name_w + (j + 1) * num_w
+                panel.blit(cell, (right - cell.get_width(), y))
+        return panel
+
+    # ====================================================
+    # CHROME TRACE DUMP
+    # ====================================================
+
+    def trace_events(self):
+        """The buffered samples as Chrome trace "complete" events (times in us)."""
+        events = []
+        for i in self._ordered().tolist():
+            name = self.stage_names[self.stage[i]]
+            detail = int(self.detail[i])
+            events.append({
+                "name": name if detail < 0 else f"{name} {detail}",
+                "cat": name,
+                "ph": "X",
+                "ts": (int(self.start_ns[i]) - self.origin_ns) / 1000,
+                "dur": int(self.duration_ns[i]) / 1000,
+                "pid": 1,
+                "tid": 1,
+                "args": {"frame": int(self.frame[i])},
+            })
+        return events
+
+    def dump_trace(self, path=None):
+        """Write the ring buffer as a Chrome trace JSON file; returns the path."""
+        if path is None:
+            path = time.strftime("frame_trace_%Y%m%d_%H%M%S.json")
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        return path
+
+
+class _NoProfiler:
+    """Stands in for FrameProfiler when profiling is off; records nothing."""
+
+    _null = contextlib.nullcontext()
+
+    def timer(self, name, detail=-1):
+        return self._null
+
+
+NO_PROFILER = _NoProfiler()
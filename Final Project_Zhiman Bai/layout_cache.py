@@ -0,0 +1,96 @@
+"""
+This file defines LayoutCache, an on-disk store of computed bulb layouts.
+Layouts are seeded (see Tree.layout_seed()), so a layout only depends on its
+key and can be reused by later sessions and by export workers instead of
+being placed again.
+
+Cache file ("bulb_layouts.sqlite"): one row per layout, keyed by
+(layout mode, year, height, width, movie count, seed), with the positions
+stored as raw int32 (x, y) pairs. Opening the cache drops the oldest layouts
+beyond MAX_LAYOUTS (by insertion order), so the file stops growing once
+filters and height mappings have produced many tree sizes.
+"""
+
+import sqlite3
+import threading
+
+import numpy as np
+
+LAYOUT_CACHE_PATH = "bulb_layouts.sqlite"
+# Bump when a placement function changes, so stale layouts are dropped.
+LAYOUT_CACHE_VERSION = 1
+COMMIT_EVERY = 64  # New layouts written per transaction.
+MAX_LAYOUTS = 20000  # Rows kept when the cache is opened (a few tens of MB at most).
+
+
+class LayoutCache:
+    def __init__(self, path=LAYOUT_CACHE_PATH, max_layouts=MAX_LAYOUTS):
+        # One connection shared by the render loop and the layout worker thread.
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        with self.lock:
+            # WAL lets export processes read while another one writes.
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            version = self.db.execute("PRAGMA user_version").fetchone()[0]
+            if version != LAYOUT_CACHE_VERSION:
+                self.db.execute("DROP TABLE IF EXISTS layouts")
+                self.db.execute(f"PRAGMA user_version={LAYOUT_CACHE_VERSION}")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS layouts ("
+                " layout TEXT, year INTEGER, height INTEGER, width INTEGER,"
+                " count INTEGER, seed INTEGER, positions BLOB,"
+                " PRIMARY KEY (layout, year, height, width, count, seed))"
+            )
+            # Rowids grow with every insert, so the lowest ones are the oldest layouts.
+            self.db.execute(
+                "DELETE FROM layouts WHERE rowid <= (SELECT MAX(rowid) FROM layouts) - ?",
+                (max_layouts,),
+            )
+            self.db.commit()
+
+    @staticmethod
+    def _row_key(year, key):
+        layout, count, width, height, seed = key
+        return (layout, year, height, width, count, seed)
+
+    def get(self, year, key):
+        """
+        Return the cached (n, 2) int32 positions for compute_layout(*key),
+        or None. year is the tree's year; key is Tree.layout_key().
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT positions FROM layouts WHERE layout=? AND year=? AND height=?"
+                " AND width=? AND count=? AND seed=?",
+                self._row_key(year, key),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return np.frombuffer(row[0], dtype=np.int32).reshape(-1, 2)
+
+    def put(self, year, key, positions):
+        data = np.ascontiguousarray(positions, dtype=np.int32).tobytes()
+        with self.lock:
+            self.db.execute("INSERT OR IGNORE INTO layouts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            self._row_key(year, key) + (data,))
+            self.pending += 1
+            if self.pending >= COMMIT_EVERY:
+                self.db.commit()
+                self.pending = 0
+
+    def flush(self):
+        """Commit layouts that are still in the open transaction."""
+        with self.lock:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,82 @@
+"""
+This file defines LayoutWorker, which computes bulb layouts on a background
+thread (or process) so that Tree.update_bulbs() can double-buffer them
+instead of placing bulbs inside the render loop.
+
+Jobs are served by priority, so a tree that just scrolled into view is laid
+out before prefetches and before the next-period refresh of trees that
+already show bulbs. With a LayoutCache, layouts are looked up there first.
+"""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from visual_objects import LAYOUT_REFRESH, compute_layout
+
+
+class LayoutWorker:
+    def __init__(self, processes=False, layout_cache=None):
+        """
+        processes=True runs compute_layout() in a worker process, which keeps
+        the pure-Python Poisson sampler from competing with the render loop
+        for the GIL. One worker is enough: a refresh only has to be ready
+        within one update period.
+        """
+        self.pool = ProcessPoolExecutor(max_workers=1) if processes else None
+        self.layout_cache = layout_cache
+        self.jobs = queue.PriorityQueue()
+        self._order = itertools.count()  # Keeps jobs of equal priority in FIFO order.
+        self.thread = threading.Thread(target=self._run, name="bulb-layout", daemon=True)
+        self.thread.start()
+
+    def submit(self, layout, num_bulbs, tree_width, tree_height, seed=None,
+               priority=LAYOUT_REFRESH, year=None):
+        """
+        Queue a layout; returns a Future of an (n, 2) position array.
+        priority is one of the LAYOUT_* constants in visual_objects.py.
+        year (the tree's year) is only needed to use the layout cache.
+        """
+        future = Future()
+        self.jobs.put((priority, next(self._order), future,
+                       (year, (layout, num_bulbs, tree_width, tree_height, seed))))
+        return future
+
+    def _run(self):
+        while True:
+            _, _, future, args = self.jobs.get()
+            if future is None:
+                return
+            # Skip jobs whose tree cancelled them (evicted or resized).
+            if not future.set_running_or_notify_cancel():
+                continue
+            year, key = args
+            cache = self.layout_cache if year is not None and key[-1] is not None else None
+            try:
+                result = cache.get(year, key) if cache is not None else None
+                if result is None:
+                    if self.pool is not None:
+                        result = self.pool.submit(compute_layout, *key).result()
+                    else:
+                        result = compute_layout(*key)
+                    if cache is not None:
+                        cache.put(year, key, result)
+            except Exception as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    def shutdown(self):
+        """Cancel queued jobs and stop the worker (waiting briefly for the current job)."""
+        while True:
+            try:
+                _, _, future, _ = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if future is not None:
+                future.cancel()
+        self.jobs.put((-1, -1, None, None))
+        self.thread.join(timeout=1.0)
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,192 @@
+"""
+This file defines the level-of-detail (LOD) views used when the window is
+zoomed out past WINDOW_SIZE years.
+
+Zoom levels, from close to wide:
+    "tree":   full trees with one bulb per movie (draw_visualization()).
+    "year":   one small tree per year; each rating category's bulbs collapse
+              into a single glyph sized by its movie count.
+    "decade": one tree per decade, aggregated from the year trees, with the
+              same per-category glyphs.
+The summaries are precomputed once from the Tree list, and a wide view never
+draws more than about 20 trees, so frame cost stays flat as the window grows.
+"""
+
+import bisect
+import math
+
+import pygame
+
+from visual_objects import (
+    BULB_RADIUS,
+    RATING_COLORS,
+    TEXT_CACHE,
+    TRUNK_H,
+    Tree,
+)
+
+# (years shown, level of detail) for each zoom step; the first is the default view.
+ZOOM_LEVELS = (
+    (10, "tree"),
+    (20, "year"),
+    (40, "decade"),
+    (100, "decade"),
+)
+GLYPH_MAX_RADIUS = 16  # Radius of the glyph for the largest category count.
+SUMMARY_STAR_RADIUS = 8
+
+
+# ====================================================
+# PRECOMPUTED SUMMARIES
+# ====================================================
+
+class SummaryTree:
+    """
+    One tree of a zoomed-out view: a single year or a whole decade.
+    category_counts has one entry per RATING_CATEGORIES bucket.
+    """
+
+    # The tree body is drawn exactly like a full Tree.
+    draw_star = Tree.draw_star
+    draw_trunk_and_canopy = Tree.draw_trunk_and_canopy
+
+    def __init__(self, year, last_year, label, avg_rating, movie_count, category_counts):
+        self.year = year
+        self.last_year = last_year
+        self.label = label
+        self.avg_rating = avg_rating
+        self.movie_count = movie_count
+        self.category_counts = list(category_counts)
+
+    def draw(self, surface, font, x_center, base_y, tree_width, height, max_count,
+             tree_color, trunk_color, text_color):
+        """
+        Draw trunk, canopy, star, label and one glyph per rating category.
+        Glyph area grows with the category's movie count relative to max_count,
+        and the largest glyphs sit lowest, where the canopy is widest.
+        """
+        self.draw_trunk_and_canopy(surface, x_center, base_y, tree_width,
+                                   height, tree_color, trunk_color)
+
+        glyphs = sorted(((n, c) for c, n in enumerate(self.category_counts) if n),
+                        reverse=True)
+        slot_h = height / (len(glyphs) + 1) if glyphs else height
+        for i, (count, category) in enumerate(glyphs):
+            y = base_y - slot_h * (i + 0.75)
+            # Keep the glyph inside the canopy and its slot.
+            half_width = tree_width / 2 * (1 - (base_y - y) / height)
+            radius = BULB_RADIUS + (GLYPH_MAX_RADIUS - BULB_RADIUS) * math.sqrt(count / max_count)
+            radius = max(2, min(radius, 0.85 * half_width, slot_h / 2))
+            pygame.draw.circle(surface, RATING_COLORS[category], (x_center, int(y)), int(radius))
+
+        self.draw_star(surface, x_center, base_y - height, SUMMARY_STAR_RADIUS, (255, 255, 0))
+        text = TEXT_CACHE.render(font, self.label, text_color)
+        surface.blit(text, text.get_rect(center=(x_center, base_y + TRUNK_H + 20)))
+
+
+class SummaryCollection:
+    """
+    A year-sorted list of SummaryTree with the statistics the render code
+    reads from TreeCollection (rating range) plus the largest category count.
+    """
+
+    def __init__(self, summaries):
+        self.trees = list(summaries)
+        self.years = [s.year for s in self.trees]
+        ratings = [s.avg_rating for s in self.trees if s.avg_rating is not None]
+        self.rating_min = min(ratings) if ratings else None
+        self.rating_max = max(ratings) if ratings else None
+        self.max_category_count = max(
+            (n for s in self.trees for n in s.category_counts), default=0) or 1
+
+    def __len__(self):
+        return len(self.trees)
+
+    def __iter__(self):
+        return iter(self.trees)
+
+    def __getitem__(self, index):
+        return self.trees[index]
+
+    def index_for_year(self, year):
+        """Index of the summary that covers year (or the nearest one after it)."""
+        i = bisect.bisect_right(self.years, year) - 1
+        return max(0, min(i, len(self.trees) - 1))
+
+
+def summarize_years(trees):
+    """One SummaryTree per Tree."""
+    return SummaryCollection(
+        SummaryTree(t.year, t.year, str(t.year), t.avg_rating, len(t.movies),
+                    t.category_counts)
+        for t in trees
+    )
+
+
+def summarize_decades(trees):
+    """
+    One SummaryTree per decade. The decade rating is the mean of the yearly
+    averages weighted by each year's number of rated movies.
+    """
+    decades = {}
+    for t in trees:
+        decades.setdefault(t.year // 10 * 10, []).append(t)
+
+    summaries = []
+    for decade, members in sorted(decades.items()):
+        rated = [(t.avg_rating, t.rated_count) for t in members if t.avg_rating is not None]
+        weight = sum(n for _, n in rated)
+        if weight:
+            avg = sum(r * n for r, n in rated) / weight
+        elif rated:
+            avg = sum(r for r, _ in rated) / len(rated)
+        else:
+            avg = None
+        counts = [sum(col) for col in zip(*(t.category_counts for t in members))]
+        summaries.append(SummaryTree(decade, members[-1].year, f"{decade}s", avg,
+                                     sum(len(t.movies) for t in members), counts))
+    return SummaryCollection(summaries)
+
+
+# ====================================================
+# ZOOM LEVELS
+# ====================================================
+
+class LodView:
+    """Precomputed year and decade summaries of a tree collection, by zoom level."""
+
+    def __init__(self, trees):
+        self.trees = trees
+        self.rebuild()
+
+    def rebuild(self):
+        """Recompute the summaries after the tree collection changed."""
+        self.summaries = {
+            "year": summarize_years(self.trees),
+            "decade": summarize_decades(self.trees),
+        }
+
+    def level(self, zoom):
+        """
+        Return (items, window_size, detail) for a ZOOM_LEVELS index.
+        items is the tree collection itself at "tree" detail.
+        """
+        years, detail = ZOOM_LEVELS[zoom]
+        if detail == "tree":
+            return self.trees, years, detail
+        if detail == "decade":
+            return self.summaries[detail], max(1, math.ceil(years / 10)), detail
+        return self.summaries[detail], years, detail
+
+    def convert_start(self, zoom, new_zoom, window_start):
+        """Window start at new_zoom that keeps the first visible year in view."""
+        items, _, _ = self.level(zoom)
+        new_items, window_size, detail = self.level(new_zoom)
+        if not items or not new_items:
+            return 0
+        year = items[max(0, min(window_start, len(items) - 1))].year
+        if detail == "tree":
+            index = bisect.bisect_left(new_items.years, year)
+        else:
+            index = new_items.index_for_year(year)
+        return max(0, min(index, len(new_items) - window_size))
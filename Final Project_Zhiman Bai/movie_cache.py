@@ -0,0 +1,439 @@
+"""
+This file keeps a compiled, columnar copy of the movie csv next to it.
+A warm start maps the cache with mmap instead of parsing the csv again.
+
+Cache layout ("<csv>.cache"):
+    MAGIC | fixed size JSON header | 8-byte aligned column sections.
+The rows are stored sorted by release year (file order inside each year),
+so each tree only needs a (start, end) slice into the columns.
+Row numbers double as movie ids: the genre and director sections are
+inverted indexes (CSR: a starts array plus the row ids of each key).
+The record store (record_store.py) uses the same container (align(),
+encode_header(), map_file()) and the same rows (read_movie_rows()).
+"""
+
+import array
+import bisect
+import csv
+import hashlib
+import json
+import math
+import mmap
+import os
+
+from movie_records import movie_dict, parse_movie_details, parse_movie_row, parse_votes
+from visual_objects import RATING_CATEGORIES, Tree, rating_category_index
+
+MAGIC = b"XMASCOL5"
+HEADER_SPACE = 4096  # Fixed size so the header can be rewritten in place.
+CACHE_SUFFIX = ".cache"
+MISSING_RATING = float("nan")
+MISSING_RUNTIME = -1
+MISSING_VOTES = -1
+
+
+# ====================================================
+# CSV SIGNATURE
+# ====================================================
+
+def file_hash(path, block_size=1 << 20):
+    """Return the sha1 hex digest of a file, read in blocks."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def csv_signature(path, with_hash=True):
+    """Return the size, mtime and (optionally) content hash of the csv."""
+    st = os.stat(path)
+    sig = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        sig["sha1"] = file_hash(path)
+    return sig
+
+
+def signature_is_fresh(signature, path):
+    """
+    Check a saved csv_signature() against the csv on disk; the content hash
+    is only computed when the size matches but the mtime moved.
+    """
+    current = csv_signature(path, with_hash=False)
+    if signature["size"] != current["size"]:
+        return False
+    return signature["mtime_ns"] == current["mtime_ns"] or signature["sha1"] == file_hash(path)
+
+
+def open_derived(path, suffix, cls):
+    """
+    Return cls's object for the csv, saved next to it as "<csv><suffix>"
+    and rebuilt when that file is missing, unreadable or stale.
+    cls provides build(csv_path), load(file) -> (object, csv signature) and
+    save(file, signature) on its objects (e.g. MovieTable, SearchIndex).
+    """
+    derived_path = path + suffix
+    if os.path.exists(derived_path):
+        try:
+            derived, signature = cls.load(derived_path)
+            if signature_is_fresh(signature, path):
+                return derived
+        except (OSError, ValueError, KeyError):
+            pass
+    derived = cls.build(path)
+    tmp_path = derived_path + ".tmp"
+    derived.save(tmp_path, csv_signature(path))
+    os.replace(tmp_path, derived_path)
+    return derived
+
+
+def cache_path_for(path):
+    return path + CACHE_SUFFIX
+
+
+# ====================================================
+# BUILD THE CACHE
+# ====================================================
+
+def align(n):
+    """Round a file offset up to the next multiple of 8."""
+    return (n + 7) & ~7
+
+
+def read_movie_rows(path, extra_columns=()):
+    """
+    Parse every movie of the csv into
+    (year, imdb, rating_cat, title, genres, director, runtime, votes) tuples
+    plus the raw text of each of extra_columns, sorted by year (csv order
+    inside a year). Rows without a usable year are skipped.
+    """
+    rows = []
+    with open(path, newline="", encoding="utf-8") as csvfile:
+        for row in csv.DictReader(csvfile):
+            parsed = parse_movie_row(row)
+            if parsed is not None:
+                rows.append(parsed + parse_movie_details(row)
+                            + (parse_votes(row.get("votes")),)
+                            + tuple(row.get(name) or "" for name in extra_columns))
+    # Stable sort keeps the csv order of movies inside each year.
+    rows.sort(key=lambda r: r[0])
+    return rows
+
+
+def build_cache(path, cache_path=None):
+    """
+    Parse the csv once and write the columnar cache file.
+    Returns the cache path.
+    """
+    cache_path = cache_path or cache_path_for(path)
+    rows = read_movie_rows(path)
+
+    categories = []
+    category_ids = {}
+    years = array.array("i")
+    imdb = array.array("d")
+    cats = array.array("B")
+    title_offsets = array.array("q", [0])
+    titles = bytearray()
+    runtimes = array.array("h")
+    votes = array.array("q")
+    genres = {}  # Genre name -> row ids.
+    directors = {}  # Director name -> row ids, in first-seen order.
+
+    for i, (year, rating, rating_cat, title, genre_list, director, runtime,
+            vote_count) in enumerate(rows):
+        if rating_cat not in category_ids:
+            category_ids[rating_cat] = len(categories)
+            categories.append(rating_cat)
+        years.append(year)
+        imdb.append(MISSING_RATING if rating is None else rating)
+        cats.append(category_ids[rating_cat])
+        titles += title.encode("utf-8")
+        title_offsets.append(len(titles))
+        runtimes.append(MISSING_RUNTIME if runtime is None else max(0, min(runtime, 32767)))
+        votes.append(MISSING_VOTES if vote_count is None else vote_count)
+        for genre in set(genre_list):
+            genres.setdefault(genre, []).append(i)
+        if director:
+            directors.setdefault(director, []).append(i)
+
+    # Inverted indexes; genres are ordered by how many movies they have.
+    genre_names = sorted(genres, key=lambda g: (-len(genres[g]), g))
+    genre_starts, genre_rows = _postings([genres[g] for g in genre_names])
+    director_starts, director_rows = _postings(list(directors.values()))
+    director_offsets = array.array("q", [0])
+    director_names = bytearray()
+    for name in directors:
+        director_names += name.encode("utf-8")
+        director_offsets.append(len(director_names))
+
+    # Year index: one entry per tree.
+    year_values = array.array("i")
+    year_starts = array.array("q")
+    year_avgs = array.array("d")
+    year_rated = array.array("q")  # Movies with a rating, the weight of year_avgs.
+    year_hist = array.array("q")  # len(RATING_CATEGORIES) counts per year.
+    year_votes = array.array("q")
+    i = 0
+    while i < len(rows):
+        j = i
+        total, n, vote_total = 0.0, 0, 0
+        hist = [0] * len(RATING_CATEGORIES)
+        while j < len(rows) and rows[j][0] == rows[i][0]:
+            hist[rating_category_index(rows[j][2])] += 1
+            vote_total += rows[j][7] or 0
+            if rows[j][1] is not None:
+                total += rows[j][1]
+                n += 1
+            j += 1
+        year_values.append(rows[i][0])
+        year_starts.append(i)
+        year_avgs.append(total / n if n else MISSING_RATING)
+        year_rated.append(n)
+        year_hist.extend(hist)
+        year_votes.append(vote_total)
+        i = j
+    year_starts.append(len(rows))
+
+    sections = [
+        ("years", years),
+        ("imdb", imdb),
+        ("cats", cats),
+        ("title_offsets", title_offsets),
+        ("titles", array.array("B", bytes(titles))),
+        ("year_values", year_values),
+        ("year_starts", year_starts),
+        ("year_avgs", year_avgs),
+        ("year_rated", year_rated),
+        ("year_hist", year_hist),
+        ("year_votes", year_votes),
+        ("runtimes", runtimes),
+        ("votes", votes),
+        ("genre_starts", genre_starts),
+        ("genre_rows", genre_rows),
+        ("director_starts", director_starts),
+        ("director_rows", director_rows),
+        ("director_offsets", director_offsets),
+        ("director_names", array.array("B", bytes(director_names))),
+    ]
+
+    header = {
+        "csv": csv_signature(path),
+        "count": len(rows),
+        "categories": categories,
+        "genres": genre_names,
+        "sections": {},
+    }
+    offset = len(MAGIC) + HEADER_SPACE
+    blobs = []
+    for name, arr in sections:
+        data = arr.tobytes()
+        header["sections"][name] = [offset, len(data), arr.typecode]
+        blobs.append((offset, data))
+        offset = align(offset + len(data))
+
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(encode_header(header))
+        for start, data in blobs:
+            f.seek(start)
+            f.write(data)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def _postings(groups):
+    """Concatenate lists of row ids into CSR arrays (starts, rows)."""
+    starts = array.array("q", [0])
+    rows = array.array("i")
+    for group in groups:
+        rows.extend(group)
+        starts.append(len(rows))
+    return starts, rows
+
+
+def encode_header(header, space=HEADER_SPACE):
+    """JSON header padded to its fixed size, so it can be rewritten in place."""
+    data = json.dumps(header).encode("utf-8")
+    if len(data) > space:
+        raise ValueError("header does not fit in its fixed space")
+    return data.ljust(space, b" ")
+
+
+# ====================================================
+# READ THE CACHE
+# ====================================================
+
+def map_file(path, magic=MAGIC, space=HEADER_SPACE):
+    """
+    Map a "MAGIC | fixed size JSON header | sections" file read-only.
+    Returns (mmap, header); raises ValueError if the magic does not match.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(magic)] != magic:
+        mm.close()
+        raise ValueError(f"{path} is not a {magic.decode('ascii')} file")
+    return mm, json.loads(mm[len(magic):len(magic) + space].decode("utf-8"))
+
+
+class MovieColumns:
+    """Read-only typed views over a memory-mapped cache file."""
+
+    def __init__(self, cache_path):
+        self.mm, self.header = map_file(cache_path)
+        self.categories = self.header["categories"]
+        self.genres = self.header["genres"]
+        # Bulb color bucket of each distinct category string.
+        self.category_index = [rating_category_index(c) for c in self.categories]
+        self.count = self.header["count"]
+
+        view = memoryview(self.mm)
+        for name, (start, nbytes, typecode) in self.header["sections"].items():
+            setattr(self, name, view[start:start + nbytes].cast(typecode))
+
+    def title(self, i):
+        start, end = self.title_offsets[i], self.title_offsets[i + 1]
+        return bytes(self.titles[start:end]).decode("utf-8")
+
+    def director(self, d):
+        """Name of director id d (its index in the director sections)."""
+        start, end = self.director_offsets[d], self.director_offsets[d + 1]
+        return bytes(self.director_names[start:end]).decode("utf-8")
+
+    def movie(self, i):
+        """Return row i as the movie dict used by Tree."""
+        rating = self.imdb[i]
+        cat = self.cats[i]
+        return movie_dict(self.title(i), None if math.isnan(rating) else rating,
+                          self.categories[cat], self.category_index[cat])
+
+
+class LazyMovies:
+    """
+    The movies of one year, built into dicts by load() only when a tree
+    needs them and dropped again by release(). count is known up front.
+    Behaves like the list of dicts that Tree expects.
+    """
+
+    def __init__(self, load, count):
+        self.load = load
+        self.count = count
+        self._movies = None
+
+    def _load(self):
+        if self._movies is None:
+            self._movies = self.load()
+        return self._movies
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def release(self):
+        self._movies = None
+
+
+class MovieSlice(LazyMovies):
+    """The movies of rows start to end of a MovieColumns (or RecordStore)."""
+
+    def __init__(self, columns, start, end):
+        super().__init__(self._build, end - start)
+        self.columns = columns
+        self.start = start
+        self.end = end
+
+    def _build(self):
+        return [self.columns.movie(i) for i in range(self.start, self.end)]
+
+
+class MovieRows(LazyMovies):
+    """
+    The movies of any list of row ids, e.g. the movies of one year that
+    pass the filter panel (see movie_filter.py).
+    """
+
+    def __init__(self, columns, rows):
+        super().__init__(self._build, len(rows))
+        self.columns = columns
+        self.rows = rows
+
+    def _build(self):
+        return [self.columns.movie(i) for i in self.rows]
+
+
+def tree_rows(tree, year_values, year_starts):
+    """
+    Cache row ids of a tree's movies, in bulb order. year_values and
+    year_starts are the year index of the cache (or of a table in the same
+    row order). Every loader keeps the csv order inside a year, like the
+    cache, so the rows are the year's range. The range is looked up rather
+    than taken from a MovieSlice: after a csv reload the slice's start
+    belongs to the old cache.
+    """
+    rows = getattr(tree.movies, "rows", None)  # Filtered trees (MovieRows).
+    if rows is not None:
+        return rows
+    i = bisect.bisect_left(year_values, tree.year)
+    if i == len(year_values) or year_values[i] != tree.year:
+        return range(0)
+    return range(year_starts[i], year_starts[i + 1])
+
+
+def _cache_is_fresh(path, cache_path):
+    """
+    Check the cached csv signature against the csv on disk (see
+    signature_is_fresh()). When only the mtime moved, the header is
+    refreshed in place so the content hash is not computed again.
+    """
+    if not os.path.exists(cache_path):
+        return False
+    try:
+        with open(cache_path, "r+b") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return False
+            header = json.loads(f.read(HEADER_SPACE).decode("utf-8"))
+            cached = header["csv"]
+            if not signature_is_fresh(cached, path):
+                return False
+            mtime_ns = csv_signature(path, with_hash=False)["mtime_ns"]
+            if cached["mtime_ns"] != mtime_ns:
+                # Same content, newer mtime.
+                cached["mtime_ns"] = mtime_ns
+                f.seek(len(MAGIC))
+                f.write(encode_header(header))
+            return True
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def open_columns(path):
+    """Return MovieColumns for the csv, rebuilding a missing or stale cache."""
+    cache_path = cache_path_for(path)
+    if not _cache_is_fresh(path, cache_path):
+        build_cache(path, cache_path)
+    return MovieColumns(cache_path)
+
+
+def load_cached_trees(path):
+    """
+    Same result as load_trees(), read from the columnar cache.
+    Movie dicts are only built for trees that are drawn.
+    """
+    columns = open_columns(path)
+    trees = []
+    n_cats = len(RATING_CATEGORIES)
+    for i, year in enumerate(columns.year_values):
+        avg = columns.year_avgs[i]
+        movies = MovieSlice(columns, columns.year_starts[i],
+                            columns.year_starts[i + 1])
+        counts = columns.year_hist[i * n_cats:(i + 1) * n_cats]
+        trees.append(Tree(year, None if math.isnan(avg) else avg, movies, counts,
+                          columns.year_votes[i], columns.year_rated[i]))
+    return trees
@@ -0,0 +1,326 @@
+"""
+This file defines the filter panel, which narrows the bulbs on every tree to
+the movies of some genres, content ratings, a director or a runtime range.
+
+Filtering never scans movie dicts. FilterIndex works on the columns of the
+csv cache (movie_cache.py), where a movie id is its row number:
+    genre, director: inverted indexes; a key's row ids set its part of a mask.
+    rating, runtime: one vectorized compare over the whole column.
+Each facet's mask is kept until that facet changes, so a toggle only rebuilds
+one facet, ANDs the masks and splits the matching rows by year.
+"""
+
+import numpy as np
+import pygame
+
+from movie_cache import MovieRows
+from visual_objects import RATING_CATEGORIES, RATING_COLORS, TEXT_CACHE, Tree
+
+# (label, shortest, longest) in minutes; movies without a runtime never match.
+RUNTIME_RANGES = (
+    ("< 90 min", 0, 89),
+    ("90-120 min", 90, 120),
+    ("> 120 min", 121, 32767),
+)
+PANEL_GENRES = 8  # Most common genres offered as chips.
+PANEL_DIRECTORS = 40  # Directors with the most movies, cycled with < and >.
+
+
+# ====================================================
+# FILTER STATE
+# ====================================================
+
+class MovieFilter:
+    """
+    The selected values of each facet. A facet with nothing selected does not
+    filter; several values of one facet match any of them (OR), and the
+    facets must all match (AND).
+    """
+
+    def __init__(self):
+        self.categories = frozenset()  # RATING_CATEGORIES indexes.
+        self.genres = frozenset()  # Genre ids (MovieColumns.genres indexes).
+        self.director = None  # Director id.
+        self.runtime = None  # RUNTIME_RANGES index.
+
+    def is_empty(self):
+        return (not self.categories and not self.genres
+                and self.director is None and self.runtime is None)
+
+    def toggle_category(self, category):
+        self.categories = self.categories ^ {category}
+
+    def toggle_genre(self, genre):
+        self.genres = self.genres ^ {genre}
+
+    def toggle_runtime(self, runtime):
+        self.runtime = None if self.runtime == runtime else runtime
+
+    def clear(self):
+        self.__init__()
+
+
+# ====================================================
+# INDEX
+# ====================================================
+
+class FilterIndex:
+    """Masks over all movies of a MovieColumns, one per facet."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.count = columns.count
+        # Bulb color bucket of every movie.
+        self.buckets = np.asarray(columns.category_index, dtype=np.uint8)[
+            np.asarray(columns.cats)]
+        self.runtimes = np.asarray(columns.runtimes)
+        self.votes = np.maximum(np.asarray(columns.votes), 0)  # Missing counts as 0.
+        imdb = np.asarray(columns.imdb)
+        self.rated = ~np.isnan(imdb)
+        self.ratings = np.where(self.rated, imdb, 0.0)  # Unrated counts as 0 in the sums.
+        self.genre_starts = np.asarray(columns.genre_starts)
+        self.genre_rows = np.asarray(columns.genre_rows)
+        self.director_starts = np.asarray(columns.director_starts)
+        self.director_rows = np.asarray(columns.director_rows)
+        self.year_values = np.asarray(columns.year_values)
+        self.year_starts = np.asarray(columns.year_starts)
+        self._facets = {}  # Facet name -> (selection, mask).
+
+    def director_ids(self, limit=PANEL_DIRECTORS):
+        """Ids of the directors with the most movies, most first."""
+        sizes = np.diff(self.director_starts)
+        return np.argsort(-sizes, kind="stable")[:limit].tolist()
+
+    def _postings_mask(self, starts, rows, keys):
+        mask = np.zeros(self.count, dtype=bool)
+        for key in keys:
+            mask[rows[starts[key]:starts[key + 1]]] = True
+        return mask
+
+    def _facet_mask(self, name, selection):
+        """Mask of one facet, rebuilt only when its selection changed."""
+        cached = self._facets.get(name)
+        if cached is not None and cached[0] == selection:
+            return cached[1]
+        if name == "categories":
+            wanted = np.zeros(len(RATING_CATEGORIES), dtype=bool)
+            wanted[list(selection)] = True
+            mask = wanted[self.buckets]
+        elif name == "genres":
+            mask = self._postings_mask(self.genre_starts, self.genre_rows, selection)
+        elif name == "director":
+            mask = self._postings_mask(self.director_starts, self.director_rows, (selection,))
+        else:
+            _, low, high = RUNTIME_RANGES[selection]
+            mask = (self.runtimes >= low) & (self.runtimes <= high)
+        self._facets[name] = (selection, mask)
+        return mask
+
+    def mask(self, movie_filter):
+        """Boolean mask of the movies that pass the filter, or None if it is empty."""
+        f = movie_filter
+        selections = [
+            ("categories", f.categories, bool(f.categories)),
+            ("genres", f.genres, bool(f.genres)),
+            ("director", f.director, f.director is not None),
+            ("runtime", f.runtime, f.runtime is not None),
+        ]
+        result = None
+        for name, selection, active in selections:
+            if not active:
+                continue
+            mask = self._facet_mask(name, selection)
+            result = mask.copy() if result is None else np.logical_and(result, mask, out=result)
+        return result
+
+    def year_rows(self, mask):
+        """
+        Split the movies that pass a mask by year.
+        Returns (row ids per year, (years, len(RATING_CATEGORIES)) category counts,
+        total votes per year, rated movies per year, mean IMDb rating per year
+        (NaN for years without a rated movie)).
+        """
+        rows = np.flatnonzero(mask).astype(np.int32)
+        bounds = np.searchsorted(rows, self.year_starts)
+        year_of_row = np.repeat(np.arange(len(self.year_values)), np.diff(bounds))
+        n_cats = len(RATING_CATEGORIES)
+        counts = np.bincount(year_of_row * n_cats + self.buckets[rows],
+                             minlength=len(self.year_values) * n_cats)
+        votes = np.bincount(year_of_row, weights=self.votes[rows],
+                            minlength=len(self.year_values))
+        rated = np.bincount(year_of_row, weights=self.rated[rows],
+                            minlength=len(self.year_values))
+        totals = np.bincount(year_of_row, weights=self.ratings[rows],
+                             minlength=len(self.year_values))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(rated > 0, totals / rated, np.nan)
+        per_year = [rows[bounds[i]:bounds[i + 1]] for i in range(len(self.year_values))]
+        return (per_year, counts.reshape(-1, n_cats), votes.astype(np.int64),
+                rated.astype(np.int64), means)
+
+
+def filtered_trees(index, originals, movie_filter):
+    """
+    Trees to show for a filter: the originals when it is empty, otherwise one
+    tree per year holding only the movies that pass, with the count, votes
+    and average rating (so the tree height) of those movies.
+    """
+    mask = index.mask(movie_filter)
+    if mask is None:
+        return list(originals)
+
+    per_year, counts, votes, rated, means = index.year_rows(mask)
+    by_year = {year: i for i, year in enumerate(index.year_values.tolist())}
+    trees = []
+    for tree in originals:
+        i = by_year.get(tree.year)
+        if i is None:
+            trees.append(Tree(tree.year, None, [], rated_count=0))
+            continue
+        avg = None if np.isnan(means[i]) else float(means[i])
+        subset = Tree(tree.year, avg, MovieRows(index.columns, per_year[i]),
+                      counts[i].tolist(), int(votes[i]), int(rated[i]))
+        subset.seed = tree.seed
+        trees.append(subset)
+    return trees
+
+
+# ====================================================
+# PANEL
+# ====================================================
+
+class FilterPanel:
+    """
+    Chips for each facet, drawn at the top of the tree area.
+    Clicking a chip changes the filter; the panel surface is only rendered
+    again after a change.
+    """
+
+    def __init__(self, index, font, topleft):
+        self.index = index
+        self.font = font
+        self.topleft = topleft
+        self.filter = MovieFilter()
+        self.visible = False
+        self.directors = index.director_ids()
+        self.director_pos = -1  # Position in self.directors; -1 is "All".
+        self.matching = index.count
+        self._surface = None
+        self._chips = []  # (rect in screen coordinates, action).
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    @property
+    def rect(self):
+        if self._surface is None:
+            return pygame.Rect(self.topleft, (0, 0))
+        return self._surface.get_rect(topleft=self.topleft)
+
+    def apply(self, trees, originals):
+        """
+        Swap the trees of a TreeCollection for the filtered ones.
+        Returns the number of movies that pass.
+        """
+        new_trees = filtered_trees(self.index, originals, self.filter)
+        for i, tree in enumerate(new_trees):
+            old = trees[i]
+            if old is not tree:
+                old.release_layout()
+                trees.replace(i, tree)
+        self.matching = trees.movie_count
+        self._surface = None
+        return self.matching
+
+    def handle_click(self, pos):
+        """
+        Act on a click. Returns "changed" if the filter changed, "inside" if
+        the click hit the panel only, or None if it missed the panel.
+        """
+        if not self.visible or not self.rect.collidepoint(pos):
+            return None
+        for rect, (facet, value) in self._chips:
+            if not rect.collidepoint(pos):
+                continue
+            f = self.filter
+            if facet == "category":
+                f.toggle_category(value)
+            elif facet == "genre":
+                f.toggle_genre(value)
+            elif facet == "runtime":
+                f.toggle_runtime(value)
+            elif facet == "director":
+                n = len(self.directors)
+                self.director_pos = (self.director_pos + 1 + value) % (n + 1) - 1
+                f.director = self.directors[self.director_pos] if self.director_pos >= 0 else None
+            else:
+                f.clear()
+                self.director_pos = -1
+            return "changed"
+        return "inside"
+
+    def draw(self, surface):
+        """Draw the panel; returns its rect, or None when hidden."""
+        if not self.visible:
+            return None
+        if self._surface is None:
+            self._render()
+        rect = self.rect
+        surface.blit(self._surface, rect)
+        return rect
+
+    def _render(self):
+        columns = self.index.columns
+        f = self.filter
+        director = "All" if f.director is None else columns.director(f.director)
+        rows = [
+            ("Rating", [(name, ("category", i), i in f.categories, RATING_COLORS[i])
+                        for i, name in enumerate(RATING_CATEGORIES)]),
+            ("Genre", [(name, ("genre", i), i in f.genres, None)
+                       for i, name in enumerate(columns.genres[:PANEL_GENRES])]),
+            ("Director", [("<", ("director", -1), False, None),
+                          (director, None, f.director is not None, None),
+                          (">", ("director", 1), False, None)]),
+            ("Runtime", [(label, ("runtime", i), f.runtime == i, None)
+                         for i, (label, _, _) in enumerate(RUNTIME_RANGES)]),
+            (f"{self.matching} of {self.index.count} movies",
+             [("Clear", ("clear", None), False, None)]),
+        ]
+
+        pad, gap = 8, 6
+        line_h = self.font.get_linesize() + 8
+        label_w = max(self.font.size(label)[0] for label, _ in rows) + 2 * gap
+        # Chip positions first, so the panel can be sized to fit them.
+        placed = []
+        width = 0
+        for r, (label, chips) in enumerate(rows):
+            x = pad + label_w
+            for text, action, selected, color in chips:
+                w = self.font.size(text)[0] + (22 if color else 12)
+                placed.append((pygame.Rect(x, pad + r * line_h, w, line_h - 4),
+                               text, action, selected, color))
+                x += w + gap
+            width = max(width, x)
+
+        panel = pygame.Surface((width + pad, pad * 2 + line_h * len(rows)), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for r, (label, _) in enumerate(rows):
+            text = TEXT_CACHE.render(self.font, label, (255, 255, 255))
+            panel.blit(text, (pad, pad + r * line_h + 2))
+
+        self._chips = []
+        ox, oy = self.topleft
+        for rect, text, action, selected, color in placed:
+            if action is not None:
+                fill = (200, 40, 40) if selected else (70, 70, 70)
+                pygame.draw.rect(panel, fill, rect, border_radius=6)
+                self._chips.append((rect.move(ox, oy), action))
+            center = rect.center
+            if color is not None:
+                # Swatch of the bulb color on the left of the chip.
+                pygame.draw.circle(panel, color, (rect.x + 9, rect.centery), 4)
+                center = (rect.centerx + 5, rect.centery)
+            text_color = (255, 230, 120) if selected and action is None else (255, 255, 255)
+            label = TEXT_CACHE.render(self.font, text, text_color)
+            panel.blit(label, label.get_rect(center=center))
+        self._surface = panel
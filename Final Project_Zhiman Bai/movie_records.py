@@ -0,0 +1,170 @@
+"""
+This file turns rows of the Christmas movies csv into plain Python values.
+It is shared by every loader so that all of them accept and skip the same rows.
+"""
+
+import csv
+import io
+
+from visual_objects import rating_category_index
+
+
+# ====================================================
+# PARSE ONE CSV ROW
+# ====================================================
+
+def parse_year(value):
+    """Return the release year as an int, or None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+def parse_imdb(value):
+    """Return the IMDb rating as a float, or None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_movie_row(row):
+    """
+    Convert one csv.DictReader row into (year, imdb_rating, rating_cat, title).
+    Returns None for rows without a usable release year.
+    """
+    year = parse_year(row.get("release_year"))
+    if year is None:
+        return None
+
+    imdb = parse_imdb(row.get("imdb_rating"))
+
+    # Content rating category(G/PG/PG-13/etc) for the Christmas bulb's color.
+    rating_cat = row.get("rating")
+    title = (row.get("title") or "").strip()
+    return year, imdb, rating_cat, title
+
+
+def parse_votes(value):
+    """Return the IMDb vote count ("517,283") as an int, or None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return int(float(value.replace(",", "")))
+    except ValueError:
+        return None
+
+
+def parse_runtime(value):
+    """Return the runtime in minutes ("97" or "97 min"), or None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return int(float(value.split()[0]))
+    except (ValueError, IndexError):
+        return None
+
+
+def parse_genres(value):
+    """Split a genre cell such as "Comedy, Drama, Romance" into a list of names."""
+    return [g.strip() for g in (value or "").split(",") if g.strip()]
+
+
+def parse_movie_details(row):
+    """
+    Return the columns used by the filter panel for one csv.DictReader row:
+    (genres, director, runtime). Missing values are [], "" and None.
+    """
+    return (
+        parse_genres(row.get("genre")),
+        (row.get("director") or "").strip(),
+        parse_runtime(row.get("runtime")),
+    )
+
+
+def movie_dict(title, imdb, rating_cat, category=None):
+    """
+    Build the movie dict stored in Tree.movies.
+    "category" is the RATING_CATEGORIES index, resolved once here so the
+    render loop never has to parse rating strings.
+    """
+    if category is None:
+        category = rating_category_index(rating_cat)
+    return {
+        "title": title,
+        "imdb_rating": imdb,
+        "rating_cat": rating_cat,
+        "category": category,
+    }
+
+
+# ====================================================
+# READ RAW CSV RECORDS
+# ====================================================
+
+def iter_raw_records(f, end=None):
+    """
+    Yield (offset, raw_bytes) for each csv record of a binary file,
+    starting at the current position of f.
+    A record ends at a newline outside quotes, so quoted fields that span
+    several lines (description, stars) stay in one record.
+    Stops before the first record that starts at or after end.
+    """
+    offset = f.tell()
+    start = offset
+    pending = []
+    quotes = 0
+    while True:
+        if not pending and end is not None and offset >= end:
+            return
+        line = f.readline()
+        if not line:
+            break
+        if not pending:
+            start = offset
+        pending.append(line)
+        offset += len(line)
+        quotes += line.count(b'"')
+        # An even number of quotes means every quoted field is closed.
+        if quotes % 2 == 0:
+            yield start, b"".join(pending)
+            pending = []
+            quotes = 0
+    if pending:
+        yield start, b"".join(pending)
+
+
+def read_header(f):
+    """Read the header record of a binary csv file and return the column names."""
+    f.seek(0)
+    for _, raw in iter_raw_records(f):
+        return next(csv.reader(io.StringIO(raw.decode("utf-8"), newline="")))
+    return []
+
+
+def parse_raw_records(fieldnames, raw_records, with_votes=False, with_index=False):
+    """
+    Parse a batch of raw records into (year, imdb, rating_cat, title) tuples,
+    with the vote count (or None) appended if with_votes is set, then the
+    position of the movie's record in raw_records if with_index is set.
+    Blank records are skipped.
+    """
+    # DictReader skips blank records, so positions are counted without them.
+    positions = [i for i, raw in enumerate(raw_records) if raw.strip(b"\r\n")]
+    text = b"".join(raw_records).decode("utf-8")
+    reader = csv.DictReader(io.StringIO(text, newline=""), fieldnames=fieldnames)
+    parsed = []
+    for position, row in zip(positions, reader):
+        movie = parse_movie_row(row)
+        if movie is not None:
+            if with_votes:
+                movie += (parse_votes(row.get("votes")),)
+            if with_index:
+                movie += (position,)
+            parsed.append(movie)
+    return parsed
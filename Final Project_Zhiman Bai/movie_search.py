@@ -0,0 +1,268 @@
+"""
+This file defines the search box, which rings the bulbs of every movie whose
+title, description, stars or director match the query, in all years.
+
+SearchIndex is a tokenized inverted index over those columns. A movie id is
+its row in the csv cache (movie_cache.py): rows are read with the same filter
+and the same stable sort by year. Matches are ranked with BM25; the last word
+of the query also matches longer words ("chris" finds "christmas"), so the
+results follow each keystroke.
+
+Index file ("<csv>.search.npz"), rebuilt when the csv changes:
+    terms:      sorted vocabulary, "\\n"-joined utf-8 bytes.
+    starts:     CSR offsets of each term's postings.
+    docs, freqs: postings (movie id, term frequency), by term then movie.
+    lengths:    tokens per movie.
+"""
+
+import array
+import bisect
+import csv
+import json
+import re
+
+import numpy as np
+import pygame
+
+from movie_cache import open_derived, tree_rows
+from movie_records import parse_movie_row
+from visual_objects import TEXT_CACHE
+
+SEARCH_FIELDS = ("title", "description", "stars", "director")
+SEARCH_SUFFIX = ".search.npz"
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_PREFIX_TERMS = 64  # Most frequent completions of a partly typed word.
+MIN_PREFIX = 2  # Shorter words are not completed (one letter would match everything).
+RESULT_LINES = 5  # Top ranked titles listed under the search box.
+HIGHLIGHT_COLOR = (255, 255, 255)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase words of a text."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+# ====================================================
+# INDEX
+# ====================================================
+
+class SearchIndex:
+    def __init__(self, terms, starts, docs, freqs, lengths):
+        self.terms = terms
+        self.starts = starts
+        self.docs = docs
+        self.freqs = freqs
+        self.lengths = lengths
+        self.count = len(lengths)
+        self.avg_length = float(lengths.mean()) if self.count else 0.0
+        # BM25 does not depend on the rest of the query, so every posting's
+        # score is computed once here and a query only adds them up.
+        doc_freqs = np.diff(starts)
+        idf = np.log(1 + (self.count - doc_freqs + 0.5) / (doc_freqs + 0.5))
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(self.avg_length, 1e-9))
+        self.weights = (np.repeat(idf, doc_freqs) * freqs * (BM25_K1 + 1)
+                        / (freqs + norms[docs])).astype(np.float32)
+
+    @classmethod
+    def build(cls, path):
+        """Tokenize the search columns of every movie in the csv."""
+        rows = []
+        with open(path, newline="", encoding="utf-8") as csvfile:
+            for row in csv.DictReader(csvfile):
+                parsed = parse_movie_row(row)
+                if parsed is not None:
+                    rows.append((parsed[0], " ".join(row.get(f) or "" for f in SEARCH_FIELDS)))
+        # Same order as the csv cache, so movie ids are cache rows.
+        rows.sort(key=lambda r: r[0])
+
+        term_ids = {}
+        token_terms = array.array("i")
+        token_docs = array.array("i")
+        lengths = np.zeros(len(rows), dtype=np.int32)
+        for doc, (_, text) in enumerate(rows):
+            tokens = tokenize(text)
+            lengths[doc] = len(tokens)
+            token_terms.extend(term_ids.setdefault(t, len(term_ids)) for t in tokens)
+            token_docs.extend([doc] * len(tokens))
+
+        # Number the terms in sorted order, then count (term, movie) pairs.
+        terms = sorted(term_ids)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[term_ids[t] for t in terms]] = np.arange(len(terms))
+        keys = rank[np.frombuffer(token_terms, dtype=np.int32)] * max(1, len(rows))
+        keys += np.frombuffer(token_docs, dtype=np.int32)
+        pairs, freqs = np.unique(keys, return_counts=True)
+        pair_terms = pairs // max(1, len(rows))
+        starts = np.searchsorted(pair_terms, np.arange(len(terms) + 1))
+        return cls(terms, starts, (pairs % max(1, len(rows))).astype(np.int32),
+                   freqs.astype(np.int32), lengths)
+
+    def save(self, path, signature):
+        with open(path, "wb") as f:
+            np.savez(f, terms=np.frombuffer("\n".join(self.terms).encode("utf-8"), np.uint8),
+                     starts=self.starts, docs=self.docs, freqs=self.freqs,
+                     lengths=self.lengths, signature=np.array(json.dumps(signature)))
+
+    @classmethod
+    def load(cls, path):
+        """Return (index, csv signature) from a saved index."""
+        with np.load(path) as data:
+            terms = data["terms"].tobytes().decode("utf-8")
+            index = cls(terms.split("\n") if terms else [], data["starts"], data["docs"],
+                        data["freqs"], data["lengths"])
+            return index, json.loads(str(data["signature"]))
+
+    # ----------------------------------------
+    # Queries
+    # ----------------------------------------
+
+    def _term_range(self, word, prefix):
+        """Term ids matching word, or starting with it if prefix is set."""
+        lo = bisect.bisect_left(self.terms, word)
+        if not prefix:
+            found = lo < len(self.terms) and self.terms[lo] == word
+            return np.arange(lo, lo + 1) if found else np.arange(0)
+        hi = bisect.bisect_left(self.terms, word + "\U0010ffff", lo)
+        ids = np.arange(lo, hi)
+        if len(ids) > MAX_PREFIX_TERMS:
+            doc_freqs = self.starts[ids + 1] - self.starts[ids]
+            ids = ids[np.argsort(-doc_freqs, kind="stable")[:MAX_PREFIX_TERMS]]
+        return ids
+
+    def search(self, query, limit=RESULT_LINES):
+        """
+        Return (mask of matching movies or None, match count, ids of the
+        `limit` best matches by BM25 score). A movie matches when every word
+        of the query matches one of its words.
+        """
+        words = tokenize(query)
+        if not words:
+            return None, 0, np.arange(0)
+        scores = np.zeros(self.count)
+        found = np.zeros(self.count, dtype=np.int32)
+        for i, word in enumerate(words):
+            # Only the word still being typed is completed.
+            prefix = (i == len(words) - 1 and len(word) >= MIN_PREFIX
+                      and not query[-1:].isspace())
+            terms = self._term_range(word, prefix)
+            if len(terms) == 0:
+                return np.zeros(self.count, dtype=bool), 0, np.arange(0)
+            slices = [slice(self.starts[t], self.starts[t + 1]) for t in terms.tolist()]
+            if len(slices) == 1:
+                # One term lists each movie once, so plain indexing is enough.
+                docs = self.docs[slices[0]]
+                scores[docs] += self.weights[slices[0]]
+                found[docs] += 1
+            else:
+                docs = np.concatenate([self.docs[s] for s in slices])
+                weights = np.concatenate([self.weights[s] for s in slices])
+                scores += np.bincount(docs, weights=weights, minlength=self.count)
+                found += np.bincount(docs, minlength=self.count) > 0
+        mask = found == len(words)
+        count = int(np.count_nonzero(mask))
+        ranked = np.where(mask, scores, -1.0)
+        best = np.argpartition(-ranked, min(limit, self.count - 1))[:min(limit, count)]
+        best = best[np.lexsort((best, -ranked[best]))]
+        return mask, count, best
+
+
+def open_search_index(path):
+    """Return the SearchIndex of the csv, rebuilding a missing or stale index file."""
+    return open_derived(path, SEARCH_SUFFIX, SearchIndex)
+
+
+# ====================================================
+# SEARCH BOX
+# ====================================================
+
+class SearchPanel:
+    """
+    A text box with the match count and the best ranked titles under it.
+    columns (MovieColumns of the same csv) gives titles, years and the row
+    range of each year for the bulb highlights.
+    """
+
+    def __init__(self, index, columns, font, topleft, width=300):
+        self.index = index
+        self.columns = columns
+        self.font = font
+        self.topleft = topleft
+        self.width = width
+        self.active = False  # Typing goes to the box.
+        self.query = ""
+        self.mask = None  # Matching movies of the current query, or None.
+        self.count = 0
+        self.best = np.arange(0)  # Ids of the best ranked matches.
+        self._tree_masks = {}  # Tree -> bool array over its movies, for this query.
+        self._surface = None
+
+    def open(self):
+        self.active = True
+        self._surface = None
+
+    def handle_key(self, event):
+        """Edit the query with a KEYDOWN event while the box is active."""
+        if event.key == pygame.K_ESCAPE:
+            self.active = False
+            self.set_query("")
+        elif event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+            self.active = False
+            self._surface = None
+        elif event.key == pygame.K_BACKSPACE:
+            self.set_query(self.query[:-1])
+        elif event.unicode and event.unicode.isprintable():
+            self.set_query(self.query + event.unicode)
+
+    def set_query(self, query):
+        self.query = query
+        self.mask, self.count, self.best = self.index.search(query)
+        self._tree_masks = {}
+        self._surface = None
+
+    def tree_mask(self, tree):
+        """Bool array over the tree's movies marking the matches, or None."""
+        if self.mask is None:
+            return None
+        mask = self._tree_masks.get(tree)
+        if mask is None:
+            rows = tree_rows(tree, self.columns.year_values, self.columns.year_starts)
+            mask = self._tree_masks[tree] = self.mask[rows]
+        return mask
+
+    def draw(self, surface):
+        """Draw the box while it is active or has a query; returns its rect or None."""
+        if not self.active and not self.query:
+            return None
+        if self._surface is None:
+            self._render()
+        rect = self._surface.get_rect(topleft=self.topleft)
+        surface.blit(self._surface, rect)
+        return rect
+
+    def _render(self):
+        pad = 6
+        line_h = self.font.get_linesize() + 2
+        lines = []
+        if self.query:
+            lines.append((f"{self.count} matches", (255, 230, 120)))
+            for i in self.best.tolist():
+                title = self.columns.title(i)
+                lines.append((f"{title} ({self.columns.years[i]})", (255, 255, 255)))
+
+        panel = pygame.Surface((self.width, 2 * pad + line_h * (len(lines) + 1) + 4),
+                               pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        box = pygame.Rect(pad, pad, self.width - 2 * pad, line_h + 4)
+        pygame.draw.rect(panel, (255, 255, 255) if self.active else (150, 150, 150), box, 1,
+                         border_radius=4)
+        text = self.query + "|" if self.active else self.query
+        label = TEXT_CACHE.render(self.font, text or "Search", (255, 255, 255))
+        panel.blit(label, (box.x + 4, box.y + 2), pygame.Rect(
+            max(0, label.get_width() - box.width + 8), 0, box.width - 8, box.height))
+        for i, (text, color) in enumerate(lines):
+            panel.blit(TEXT_CACHE.render(self.font, text, color),
+                       (pad, box.bottom + 4 + i * line_h))
+        self._surface = panel
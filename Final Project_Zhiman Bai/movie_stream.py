@@ -0,0 +1,288 @@
+"""
+This file loads very large movie csv files in one streaming pass.
+Only per-year running aggregates and the byte offset of every movie's record
+stay in memory; the movies of a year are re-read from exactly those records
+when its tree is shown, and dropped again when it is hidden.
+"""
+
+import array
+import os
+
+from movie_cache import LazyMovies
+from movie_records import iter_raw_records, movie_dict, parse_raw_records, read_header
+from rating_aggregators import RatingSketch
+from visual_objects import RATING_CATEGORIES, Tree, rating_category_index
+
+CHUNK_ROWS = 20000  # Raw csv records parsed together in one batch.
+
+
+# ====================================================
+# PER-YEAR RUNNING AGGREGATES
+# ====================================================
+
+class YearAggregate:
+    """
+    Running statistics for one release year:
+    movie count, mean IMDb rating, rating-category histogram and total votes.
+    sketch summarizes the ratings for the other height aggregators.
+    offsets holds the csv byte offset of each movie's record (8 bytes a movie).
+    """
+
+    def __init__(self, year):
+        self.year = year
+        self.count = 0
+        self.rating_count = 0
+        self.mean = None
+        self.histogram = [0] * len(RATING_CATEGORIES)
+        self.votes = 0
+        self.sketch = RatingSketch()
+        self.offsets = array.array("q")
+
+    def add(self, imdb, rating_cat, offset=None, votes=None):
+        self.count += 1
+        self.votes += votes or 0
+        self.histogram[rating_category_index(rating_cat)] += 1
+        self.sketch.add(imdb, votes)
+        if imdb is not None:
+            self.rating_count += 1
+            if self.mean is None:
+                self.mean = imdb
+            else:
+                # Running mean, so the ratings never need to be stored.
+                self.mean += (imdb - self.mean) / self.rating_count
+        if offset is not None:
+            self.offsets.append(offset)
+
+
+# ====================================================
+# ON-DEMAND MOVIE DETAIL
+# ====================================================
+
+class StreamedMovies(LazyMovies):
+    """The movies of one year, read back from the csv only when needed."""
+
+    def __init__(self, loader, aggregate):
+        super().__init__(self._build, aggregate.count)
+        self.loader = loader
+        self.aggregate = aggregate
+
+    def _build(self):
+        return self.loader.load_year(self.aggregate)
+
+    def move_records(self, offsets, fieldnames):
+        """Read the same movies from new record offsets (the csv was rewritten)."""
+        self.aggregate.offsets = offsets
+        self.loader.fieldnames = fieldnames
+        self.release()
+
+
+class StreamingLoader:
+    """Streams a csv file chunk by chunk and reads single years back by record offset."""
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.fieldnames = []
+
+    def iter_chunks(self):
+        """
+        Yield the parsed movies of the whole file, one chunk at a time.
+        Each movie carries its vote count and the byte offset of its record.
+        """
+        with open(self.path, "rb") as f:
+            self.fieldnames = read_header(f)
+            offsets = []
+            batch = []
+            for offset, raw in iter_raw_records(f):
+                offsets.append(offset)
+                batch.append(raw)
+                if len(batch) == self.chunk_rows:
+                    yield self._parse_chunk(offsets, batch)
+                    offsets, batch = [], []
+            if batch:
+                yield self._parse_chunk(offsets, batch)
+
+    def _parse_chunk(self, offsets, batch):
+        return [movie[:-1] + (offsets[movie[-1]],)
+                for movie in parse_raw_records(self.fieldnames, batch, with_votes=True,
+                                               with_index=True)]
+
+    def load_year(self, aggregate):
+        """Read and parse only the records of this year's movies."""
+        batch = []
+        with open(self.path, "rb") as f:
+            for offset in aggregate.offsets:
+                # Records of a year often follow each other; only seek on a gap.
+                if f.tell() != offset:
+                    f.seek(offset)
+                for _, raw in iter_raw_records(f):
+                    batch.append(raw)
+                    break
+        return [movie_dict(title, imdb, rating_cat)
+                for _, imdb, rating_cat, title in parse_raw_records(self.fieldnames, batch)]
+
+
+def load_trees_streaming(path, chunk_rows=CHUNK_ROWS):
+    """
+    Build the same sorted list of trees as load_trees() in one pass
+    with bounded memory: one YearAggregate per year (its aggregates plus one
+    offset per movie) and one csv chunk.
+    """
+    loader = StreamingLoader(path, chunk_rows)
+    years = {}
+    for movies in loader.iter_chunks():
+        for year, imdb, rating_cat, _, votes, offset in movies:
+            agg = years.get(year)
+            if agg is None:
+                agg = years[year] = YearAggregate(year)
+            agg.add(imdb, rating_cat, offset, votes)
+
+    trees = []
+    for year, agg in sorted(years.items()):
+        tree = Tree(year, agg.mean, StreamedMovies(loader, agg), agg.histogram, agg.votes,
+                    agg.rating_count)
+        tree.rating_sketch = agg.sketch
+        trees.append(tree)
+    return trees
+
+
+# ====================================================
+# PARALLEL SHARDED PARSING
+# ====================================================
+
+def _merge_aggregate(target, other):
+    """Fold the partial aggregate of another shard into target."""
+    total = target.rating_count + other.rating_count
+    if other.rating_count:
+        if target.mean is None:
+            target.mean = other.mean
+        else:
+            target.mean += (other.mean - target.mean) * other.rating_count / total
+    target.rating_count = total
+    target.count += other.count
+    target.votes += other.votes
+    target.sketch.merge(other.sketch)
+    for i, n in enumerate(other.histogram):
+        target.histogram[i] += n
+
+
+def find_shard_boundaries(path, num_shards, block_size=1 << 20):
+    """
+    Split the csv body into byte ranges that start and end on record boundaries.
+    A newline is only a boundary when the number of quotes before it is even,
+    so quoted multi-line fields are never cut in half.
+    Returns (fieldnames, [(start, end), ...]).
+    """
+    with open(path, "rb") as f:
+        fieldnames = read_header(f)
+        f.seek(0)
+        body_start = next((start + len(raw) for start, raw in iter_raw_records(f)), 0)
+        size = f.seek(0, 2)
+        if body_start >= size:
+            return fieldnames, []
+
+        step = max(1, (size - body_start) // max(1, num_shards))
+        targets = [body_start + k * step for k in range(1, num_shards)]
+        cuts = [body_start]
+
+        f.seek(0)
+        block_start = 0
+        quotes_before = 0
+        while targets:
+            block = f.read(block_size)
+            if not block:
+                break
+            pos = max(0, targets[0] - block_start)
+            quotes = quotes_before + block.count(b'"', 0, pos)
+            while targets and pos < len(block):
+                nl = block.find(b"\n", pos)
+                if nl < 0:
+                    break
+                quotes += block.count(b'"', pos, nl)
+                pos = nl + 1
+                if quotes % 2 == 0 and block_start + pos > cuts[-1]:
+                    cuts.append(block_start + pos)
+                    # Skip targets that this cut already passed.
+                    while targets and targets[0] < cuts[-1]:
+                        targets.pop(0)
+                    if targets:
+                        quotes += block.count(b'"', pos, max(pos, targets[0] - block_start))
+                        pos = max(pos, targets[0] - block_start)
+            quotes_before += block.count(b'"')
+            block_start += len(block)
+
+    cuts.append(size)
+    shards = [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+    return fieldnames, shards
+
+
+def parse_shard(path, fieldnames, start, end, chunk_rows=CHUNK_ROWS):
+    """
+    Parse one byte range of the csv in a worker process.
+    Returns ({year: YearAggregate}, {year: [(imdb, rating_cat, title), ...]})
+    for that range; plain tuples are cheaper to send back than dicts.
+    """
+    aggregates = {}
+    movies = {}
+
+    def consume(batch):
+        for year, imdb, rating_cat, title, votes in parse_raw_records(fieldnames, batch,
+                                                                     with_votes=True):
+            agg = aggregates.get(year)
+            if agg is None:
+                agg = aggregates[year] = YearAggregate(year)
+                movies[year] = []
+            agg.add(imdb, rating_cat, votes=votes)
+            movies[year].append((imdb, rating_cat, title))
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        batch = []
+        for _, raw in iter_raw_records(f, end):
+            batch.append(raw)
+            if len(batch) == chunk_rows:
+                consume(batch)
+                batch = []
+        if batch:
+            consume(batch)
+    return aggregates, movies
+
+
+def load_trees_parallel(path, workers=None, shards_per_worker=4):
+    """
+    Build the same sorted list of trees as load_trees(), parsing byte-range
+    shards of the csv in a ProcessPoolExecutor and merging the partial
+    per-year aggregates in file order.
+    """
+    # Imported here so the streaming loader does not pay for it.
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    fieldnames, shards = find_shard_boundaries(path, workers * shards_per_worker)
+
+    years = {}
+    movies = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(parse_shard, path, fieldnames, start, end)
+                   for start, end in shards]
+        # Results are merged in shard order so movies keep their csv order.
+        for future in futures:
+            part_aggregates, part_movies = future.result()
+            for year, part in part_aggregates.items():
+                if year not in years:
+                    years[year] = YearAggregate(year)
+                    movies[year] = []
+                _merge_aggregate(years[year], part)
+                movies[year].extend(
+                    movie_dict(title, imdb, rating_cat)
+                    for imdb, rating_cat, title in part_movies[year]
+                )
+
+    trees = []
+    for year in sorted(years):
+        agg = years[year]
+        tree = Tree(year, agg.mean, movies[year], agg.histogram, agg.votes,
+                    agg.rating_count)
+        tree.rating_sketch = agg.sketch
+        trees.append(tree)
+    return trees
@@ -0,0 +1,274 @@
+"""
+This file defines MovieTable, the numeric columns of the csv that load_trees()
+does not use (votes, gross, runtime, meta_score), parsed once with vectorized
+string operations and kept as contiguous NumPy arrays.
+
+Raw formats handled by parse_number_column():
+    votes:      "517,283"
+    gross:      "$59.70M", "$850K", "$1.2B"
+    runtime:    "97" or "97 min"
+    meta_score: "55"
+Every column is float64 with NaN for missing or invalid values, plus a
+boolean "present" mask. Rows are the rows of the csv cache (movie_cache.py)
+in the same order, so a row id means the same movie in both; the columns the
+cache already has (IMDb rating, votes, runtime) are copied from it.
+
+The table is saved next to the csv ("<csv>.table.npz") and rebuilt when the
+csv changes. HEIGHT_MAPPINGS and BULB_SIZE_MAPPINGS turn it into tree heights
+and bulb radii for the visualization.
+"""
+
+import json
+import math
+
+import numpy as np
+
+from movie_cache import (
+    MISSING_RUNTIME,
+    MISSING_VOTES,
+    open_columns,
+    open_derived,
+    read_movie_rows,
+    tree_rows,
+)
+from rating_aggregators import RATING_AGGREGATORS, RatingGroups
+from visual_objects import BULB_RADIUS, compute_tree_height
+
+TABLE_SUFFIX = ".table.npz"
+NUMBER_COLUMNS = ("imdb_rating", "votes", "gross", "runtime", "meta_score")
+_SUFFIX_SCALES = ((b"K", 1e3), (b"M", 1e6), (b"B", 1e9))
+
+
+# ====================================================
+# VECTORIZED PARSERS
+# ====================================================
+
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def _as_bytes(values):
+    """Values as a fixed-width bytes array; NumPy's string ops are fastest on it."""
+    try:
+        return np.asarray(values, dtype="S")
+    except UnicodeEncodeError:
+        return np.array([v.encode("ascii", "replace") for v in values], dtype="S")
+
+
+def parse_number_column(values):
+    """
+    Parse a sequence of number strings with optional thousands separators,
+    "$", " min" and a K/M/B suffix. Returns (numbers, present); numbers is
+    NaN where present is False.
+    """
+    if len(values) == 0:
+        return np.zeros(0), np.zeros(0, dtype=bool)
+    text = np.char.upper(_as_bytes(values))
+    for junk in (b",", b"$", b"MIN"):
+        text = np.char.replace(text, junk, b"")
+    text = np.char.strip(text)
+
+    scale = np.ones(len(text))
+    for suffix, factor in _SUFFIX_SCALES:
+        scale[np.char.endswith(text, suffix)] = factor
+    text = np.char.rstrip(text, b"KMB")
+
+    numbers = np.full(len(text), np.nan)
+    present = text != b""
+    try:
+        numbers[present] = text[present].astype(np.float64)
+    except ValueError:
+        # Some cell is not a number; parse one by one so only it becomes NaN.
+        numbers[present] = [_to_float(t) for t in text[present].tolist()]
+    numbers *= scale
+    return numbers, ~np.isnan(numbers)
+
+
+# ====================================================
+# TABLE
+# ====================================================
+
+class MovieTable:
+    """
+    Numeric columns of every movie, in csv cache row order.
+    columns maps a name of NUMBER_COLUMNS to its float64 array.
+    """
+
+    def __init__(self, years, columns):
+        self.years = years
+        self.columns = columns
+        self.present = {name: ~np.isnan(values) for name, values in columns.items()}
+        self.count = len(years)
+        # Year index, as in the csv cache: the rows of year_values[i] start at year_starts[i].
+        starts = np.flatnonzero(np.diff(years)) + 1
+        self.year_starts = np.concatenate(([0], starts, [self.count])).astype(np.int64)
+        self.year_values = years[self.year_starts[:-1]] if self.count else years[:0]
+        self._rating_groups = None
+
+    @classmethod
+    def build(cls, path):
+        """
+        Take years, IMDb ratings, votes and runtimes from the csv cache and
+        parse only gross and meta_score from the csv, each in one vectorized
+        pass. The csv rows are read like the cache reads them
+        (read_movie_rows()), so both tables have the same rows.
+        """
+        columns = open_columns(path)
+        rows = read_movie_rows(path, ("gross", "meta_score"))
+        years = np.frombuffer(columns.years, dtype=np.int32).copy()
+        if len(rows) != len(years):
+            raise ValueError(f"{path} changed while its movie table was built")
+        votes = np.frombuffer(columns.votes, dtype=np.int64).astype(np.float64)
+        runtimes = np.frombuffer(columns.runtimes, dtype=np.int16).astype(np.float64)
+        table = {
+            "imdb_rating": np.frombuffer(columns.imdb, dtype=np.float64).copy(),
+            "votes": np.where(votes == MISSING_VOTES, np.nan, votes),
+            "runtime": np.where(runtimes == MISSING_RUNTIME, np.nan, runtimes),
+        }
+        for name, column in (("gross", 8), ("meta_score", 9)):
+            table[name], _ = parse_number_column([r[column] for r in rows])
+        return cls(years, {name: table[name] for name in NUMBER_COLUMNS})
+
+    def save(self, path, signature):
+        with open(path, "wb") as f:
+            np.savez(f, years=self.years, signature=np.array(json.dumps(signature)),
+                     **self.columns)
+
+    @classmethod
+    def load(cls, path):
+        """Return (table, csv signature) from a saved table."""
+        with np.load(path) as data:
+            table = cls(data["years"], {name: data[name] for name in NUMBER_COLUMNS})
+            return table, json.loads(str(data["signature"]))
+
+    # ----------------------------------------
+    # Per-year aggregates
+    # ----------------------------------------
+
+    def year_sum(self, values):
+        """Sum of a per-movie array (NaN counts as 0) for every year."""
+        if not self.count:
+            return np.zeros(0)
+        return np.add.reduceat(np.nan_to_num(values), self.year_starts[:-1])
+
+    def rating_groups(self):
+        """RatingGroups of the IMDb ratings (weighted by votes), built on first use."""
+        if self._rating_groups is None:
+            self._rating_groups = RatingGroups(self.year_values, self.year_starts,
+                                               self.columns["imdb_rating"], self.columns["votes"])
+        return self._rating_groups
+
+    def year_mean(self, name, weights=None):
+        """
+        Mean of a column for every year over the movies that have it, or
+        weighted by another per-movie array. NaN for years without data.
+        """
+        values = self.columns[name]
+        if weights is None:
+            weights = np.ones(self.count)
+        weights = np.where(self.present[name], np.nan_to_num(weights), 0.0)
+        total = self.year_sum(values * weights)
+        weight = self.year_sum(weights)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(weight > 0, total / weight, np.nan)
+
+
+def open_movie_table(path):
+    """Return the MovieTable of the csv, rebuilding a missing or stale table file."""
+    return open_derived(path, TABLE_SUFFIX, MovieTable)
+
+
+# ====================================================
+# HEIGHT AND BULB SIZE MAPPINGS
+# ====================================================
+
+def _log_total(table, name):
+    return np.log10(1 + table.year_sum(table.columns[name]))
+
+
+def _rating_aggregate(name):
+    label, compute = RATING_AGGREGATORS[name]
+    return label, lambda t: compute(t.rating_groups())
+
+
+# name -> (legend label, per-year values of a MovieTable). "imdb" is the
+# default: Tree.avg_rating, which needs no table.
+HEIGHT_MAPPINGS = {
+    "imdb": ("Average IMDb rating", None),
+    "median": _rating_aggregate("median"),
+    "p90": _rating_aggregate("p90"),
+    "vote_weighted": _rating_aggregate("vote_weighted"),
+    "count": _rating_aggregate("count"),
+    "votes": ("Total IMDb votes (log)", lambda t: _log_total(t, "votes")),
+    "gross": ("Total box office gross (log)", lambda t: _log_total(t, "gross")),
+    "meta_score": ("Average Metascore", lambda t: t.year_mean("meta_score")),
+}
+
+# name -> (legend label, per-movie column scaled to the radius, log scale).
+BULB_SIZE_MAPPINGS = {
+    "uniform": ("Same size", None, False),
+    "votes": ("IMDb votes", "votes", True),
+    "gross": ("Box office gross", "gross", True),
+    "runtime": ("Runtime", "runtime", False),
+}
+BULB_RADIUS_RANGE = (BULB_RADIUS - 2, BULB_RADIUS + 3)
+
+
+class HeightScale:
+    """Tree heights from per-year values (NaN: no value), scaled over all years."""
+
+    def __init__(self, label, year_values, values):
+        self.label = label
+        self.values = {int(y): float(v) for y, v in zip(year_values, values)
+                       if not np.isnan(v)}
+        self.min = min(self.values.values(), default=0)
+        self.max = max(self.values.values(), default=0)
+
+    @classmethod
+    def for_mapping(cls, table, mapping):
+        """Heights from one of HEIGHT_MAPPINGS."""
+        label, compute = HEIGHT_MAPPINGS[mapping]
+        return cls(label, table.year_values, compute(table))
+
+    @classmethod
+    def for_aggregator(cls, source, name):
+        """Heights from one of RATING_AGGREGATORS over a rating source (e.g. SketchGroups)."""
+        label, compute = RATING_AGGREGATORS[name]
+        return cls(label, source.year_values, compute(source))
+
+    def height(self, tree):
+        return compute_tree_height(self.values.get(tree.year), self.min, self.max)
+
+
+def bulb_radii(table, mapping):
+    """
+    Radius of every movie's bulb for one of BULB_SIZE_MAPPINGS, as uint8,
+    or None for the default same-size bulbs. Movies without the value keep
+    BULB_RADIUS.
+    """
+    _, name, log = BULB_SIZE_MAPPINGS[mapping]
+    if name is None:
+        return None
+    values = table.columns[name]
+    present = table.present[name]
+    if log:
+        values = np.log10(1 + np.maximum(values, 0))
+    low, high = BULB_RADIUS_RANGE
+    radii = np.full(table.count, BULB_RADIUS, dtype=np.uint8)
+    if present.any():
+        v_min, v_max = values[present].min(), values[present].max()
+        t = (values[present] - v_min) / (v_max - v_min) if v_max > v_min else 0.5
+        radii[present] = np.round(low + t * (high - low)).astype(np.uint8)
+    return radii
+
+
+def apply_bulb_radii(trees, table, radii):
+    """Give every tree the radii of its movies (None: same-size bulbs)."""
+    for tree in trees:
+        if radii is None:
+            tree.set_bulb_radii(None)
+        else:
+            tree.set_bulb_radii(radii[tree_rows(tree, table.year_values, table.year_starts)])
@@ -0,0 +1,223 @@
+"""
+This file defines the per-year rating aggregators that tree height can show
+instead of the plain average: median, 90th percentile, vote-weighted mean and
+movie count (RATING_AGGREGATORS; add an entry to plug in another one).
+
+An aggregator is a function of a rating source, which answers every year at
+once as an array:
+    RatingGroups: exact, from a ratings column in year order. One group-by
+        pass (a sort within years plus bincounts) prepares all of them, so
+        switching aggregator is only an index lookup.
+    SketchGroups: from the RatingSketch that the streaming loaders keep per
+        year (a t-digest of the ratings plus running sums). Sketches of csv
+        shards merge, and no aggregator needs to read the csv again.
+"""
+
+import math
+
+import numpy as np
+
+TDIGEST_COMPRESSION = 100  # About compression / 2 centroids per digest.
+TDIGEST_BUFFER = 500  # Values added before the buffer is merged into the centroids.
+
+
+# ====================================================
+# T-DIGEST
+# ====================================================
+
+class TDigest:
+    """
+    Mergeable quantile sketch (a merging t-digest). Values are buffered and
+    merged into weighted centroids that are small near the tails, so extreme
+    quantiles stay accurate with a fixed number of centroids.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+
+    @property
+    def count(self):
+        return float(self.weights.sum()) + len(self._buffer)
+
+    def add(self, value):
+        self._buffer.append(value)
+        if len(self._buffer) >= TDIGEST_BUFFER:
+            self._compress()
+
+    def merge(self, other):
+        """Fold another digest into this one."""
+        other._compress()
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(other.means, other.weights)
+
+    def _compress(self, means=None, weights=None):
+        buffer = np.asarray(self._buffer, dtype=np.float64)
+        self._buffer = []
+        if len(buffer):
+            self.min = min(self.min, float(buffer.min()))
+            self.max = max(self.max, float(buffer.max()))
+        parts = [self.means, buffer] + ([means] if means is not None else [])
+        all_means = np.concatenate(parts)
+        if len(all_means) == len(self.means):
+            return
+        all_weights = np.concatenate([self.weights, np.ones(len(buffer))]
+                                     + ([weights] if weights is not None else []))
+        order = np.argsort(all_means, kind="stable")
+        all_means, all_weights = all_means[order], all_weights[order]
+
+        # k1 scale: a centroid covers at most one unit of
+        # k(q) = compression / (2 pi) * asin(2q - 1), which is steep near q = 0 and 1.
+        total = all_weights.sum()
+        q_left = (np.cumsum(all_weights) - all_weights) / total
+        k = np.floor(self.compression / (2 * math.pi) * np.arcsin(2 * q_left - 1))
+        starts = np.flatnonzero(np.diff(k, prepend=k[0] - 1))
+        self.weights = np.add.reduceat(all_weights, starts)
+        self.means = np.add.reduceat(all_means * all_weights, starts) / self.weights
+
+    def quantile(self, q):
+        """Estimated q-quantile (0 <= q <= 1), or NaN for an empty digest."""
+        self._compress()
+        total = self.weights.sum()
+        if total == 0:
+            return math.nan
+        if len(self.means) == 1:
+            return float(self.means[0])
+        # Interpolate between centroid centers, pinned to the exact min and max.
+        # Positions count from 0 to total - 1 like sorted values, so a digest of
+        # single values gives the same quantiles as RatingGroups.
+        centers = np.cumsum(self.weights) - self.weights / 2 - 0.5
+        return float(np.interp(q * (total - 1), np.concatenate(([0.0], centers, [total - 1])),
+                               np.concatenate(([self.min], self.means, [self.max]))))
+
+
+class RatingSketch:
+    """Mergeable summary of one year's ratings: a TDigest and running sums."""
+
+    def __init__(self):
+        self.digest = TDigest()
+        self.count = 0  # Movies, rated or not.
+        self.rated = 0
+        self.total = 0.0
+        self.weighted_total = 0.0  # Sum of rating * votes.
+        self.weight = 0.0  # Votes of the rated movies.
+
+    def add(self, imdb, votes=None):
+        self.count += 1
+        if imdb is None:
+            return
+        self.rated += 1
+        self.total += imdb
+        self.digest.add(imdb)
+        if votes:
+            self.weighted_total += imdb * votes
+            self.weight += votes
+
+    def merge(self, other):
+        self.digest.merge(other.digest)
+        self.count += other.count
+        self.rated += other.rated
+        self.total += other.total
+        self.weighted_total += other.weighted_total
+        self.weight += other.weight
+
+
+# ====================================================
+# RATING SOURCES
+# ====================================================
+
+class RatingSource:
+    """
+    Per-year arrays shared by the exact and sketched sources: counts, rated,
+    totals, weighted_totals and weights, in year_values order.
+    """
+
+    def count(self):
+        return self.counts.astype(np.float64)
+
+    def mean(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.rated > 0, self.totals / self.rated, np.nan)
+
+    def vote_weighted_mean(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.weights > 0, self.weighted_totals / self.weights, np.nan)
+
+
+class RatingGroups(RatingSource):
+    """
+    Exact aggregates of a ratings column grouped by year. year_starts holds
+    the first row of every year plus the row count (as in the csv cache);
+    ratings and votes are per row, NaN where missing.
+    """
+
+    def __init__(self, year_values, year_starts, ratings, votes):
+        self.year_values = np.asarray(year_values)
+        year_starts = np.asarray(year_starts, dtype=np.int64)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        n_years = len(self.year_values)
+        self.counts = np.diff(year_starts)
+        group = np.repeat(np.arange(n_years), self.counts)
+
+        # The group-by pass: ratings sorted inside each year (NaN last), and
+        # every sum the aggregators need.
+        self.sorted = ratings[np.lexsort((ratings, group))]
+        self.starts = year_starts[:-1]
+        rated = ~np.isnan(ratings)
+        self.rated = np.bincount(group[rated], minlength=n_years)
+        self.totals = np.bincount(group[rated], weights=ratings[rated], minlength=n_years)
+        votes = np.where(rated, np.maximum(np.nan_to_num(np.asarray(votes, np.float64)), 0), 0)
+        self.weighted_totals = np.bincount(group, weights=votes * np.nan_to_num(ratings),
+                                           minlength=n_years)
+        self.weights = np.bincount(group, weights=votes, minlength=n_years)
+
+    def quantile(self, q):
+        """Linearly interpolated q-quantile of every year's ratings."""
+        pos = self.starts + q * np.maximum(self.rated - 1, 0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        has = self.rated > 0
+        values = np.full(len(self.year_values), np.nan)
+        low, high = self.sorted[lo[has]], self.sorted[hi[has]]
+        values[has] = low + (high - low) * (pos[has] - lo[has])
+        return values
+
+
+class SketchGroups(RatingSource):
+    """Approximate aggregates from one RatingSketch per year."""
+
+    def __init__(self, year_values, sketches):
+        self.year_values = np.asarray(year_values)
+        self.sketches = list(sketches)
+        self.counts = np.array([s.count for s in self.sketches], dtype=np.int64)
+        self.rated = np.array([s.rated for s in self.sketches], dtype=np.int64)
+        self.totals = np.array([s.total for s in self.sketches], dtype=np.float64)
+        self.weighted_totals = np.array([s.weighted_total for s in self.sketches],
+                                        dtype=np.float64)
+        self.weights = np.array([s.weight for s in self.sketches], dtype=np.float64)
+
+    @classmethod
+    def from_trees(cls, trees):
+        """Sketches of the trees' years, or None unless every tree has one."""
+        trees = list(trees)
+        if not trees or any(t.rating_sketch is None for t in trees):
+            return None
+        return cls([t.year for t in trees], [t.rating_sketch for t in trees])
+
+    def quantile(self, q):
+        return np.array([s.digest.quantile(q) for s in self.sketches])
+
+
+# name -> (legend label, per-year values of a rating source).
+RATING_AGGREGATORS = {
+    "mean": ("Average IMDb rating", lambda s: s.mean()),
+    "median": ("Median IMDb rating", lambda s: s.quantile(0.5)),
+    "p90": ("90th percentile IMDb rating", lambda s: s.quantile(0.9)),
+    "vote_weighted": ("Vote-weighted IMDb rating", lambda s: s.vote_weighted_mean()),
+    "count": ("Movies per year", lambda s: s.count()),
+}
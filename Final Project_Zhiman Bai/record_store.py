@@ -0,0 +1,355 @@
+"""
+This file defines the record store, an on-disk format for the movie catalog
+("christmas_movies.records") that the visualizer (load_trees_for()), the frame
+export and the analysis scripts can share. Opening it maps it with mmap and
+reads only the header, so no movie is parsed or copied at startup. The
+visualizer's filter panel, search box, H/B mappings and live reload are built
+on the csv and its cache, so they are off when it shows a record store.
+
+File layout (the csv cache's container, see movie_cache.py):
+    MAGIC | fixed size JSON header | segments.
+A segment is the interned strings that are new to it, followed by its
+fixed-width records (RECORD_DTYPE, 8-byte aligned). Strings are referenced by
+(file offset, byte length) and every distinct title, content rating, director
+and genre list is stored once, so segments can point at strings of earlier ones.
+
+Records are sorted by release year. New release years are appended as a new
+segment after the last one and the header is rewritten last, so a reader that
+opened the file before an append keeps a consistent (older) view.
+
+Example:
+    python record_store.py build christmas_movies.csv
+    python record_store.py append christmas_movies.records new_movies.csv
+    python record_store.py info christmas_movies.records
+"""
+
+import argparse
+import bisect
+import math
+import os
+
+import numpy as np
+
+from movie_cache import (
+    MISSING_RUNTIME,
+    MISSING_VOTES,
+    MovieSlice,
+    align,
+    encode_header,
+    map_file,
+    read_movie_rows,
+)
+from movie_records import movie_dict
+from movie_table import parse_number_column
+from visual_objects import RATING_CATEGORIES, Tree, rating_category_index
+
+MAGIC = b"XMASREC2"
+HEADER_SPACE = 65536  # Fixed size so appends can rewrite the header in place.
+RECORD_SUFFIX = ".records"
+MISSING_META_SCORE = -1
+STRING_FIELDS = ("title", "rating", "director", "genres")
+
+# One movie. Strings are (offset, length) pairs into the file; missing numbers
+# are NaN (floats) or -1 (ints).
+RECORD_DTYPE = np.dtype([
+    ("imdb_rating", "<f8"),
+    ("gross", "<f8"),
+    ("votes", "<i8"),
+    ("title", "<u8"), ("title_len", "<u4"),
+    ("rating", "<u8"), ("rating_len", "<u4"),
+    ("director", "<u8"), ("director_len", "<u4"),
+    ("genres", "<u8"), ("genres_len", "<u4"),
+    ("year", "<i4"),
+    ("runtime", "<i2"),
+    ("meta_score", "<i2"),
+    ("category", "u1"),  # RATING_CATEGORIES index of the content rating.
+    ("_pad", "V7"),
+])
+
+
+def record_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + RECORD_SUFFIX
+
+
+# ====================================================
+# READ THE CSV
+# ====================================================
+
+def read_catalog_rows(csv_path):
+    """
+    Parse every movie of a csv into
+    (year, imdb, rating_cat, title, genres, director, runtime, votes, gross, meta_score)
+    tuples: the csv cache's rows (read_movie_rows()) with gross and meta_score.
+    """
+    rows = read_movie_rows(csv_path, ("gross", "meta_score"))
+    gross, _ = parse_number_column([r[8] for r in rows])
+    meta, _ = parse_number_column([r[9] for r in rows])
+    return [row[:8] + (g, m) for row, g, m in zip(rows, gross.tolist(), meta.tolist())]
+
+
+# ====================================================
+# WRITE SEGMENTS
+# ====================================================
+
+class StringHeap:
+    """Writes each distinct string once at the end of a file opened for writing."""
+
+    def __init__(self, f, interned=None):
+        self.f = f
+        self.interned = interned if interned is not None else {}  # Text -> (offset, length).
+
+    def intern(self, text):
+        ref = self.interned.get(text)
+        if ref is None:
+            data = text.encode("utf-8")
+            ref = self.interned[text] = (self.f.tell(), len(data))
+            self.f.write(data)
+        return ref
+
+
+def _write_segment(f, rows, heap, first_row):
+    """
+    Write the new strings and the records of rows (sorted by year) at the end
+    of f. Returns (segment [offset, count], year index entries).
+    """
+    records = np.zeros(len(rows), dtype=RECORD_DTYPE)
+    refs = {name: [] for name in STRING_FIELDS}
+    for (year, imdb, rating_cat, title, genres, director, runtime, votes,
+         gross, meta) in rows:
+        refs["title"].append(heap.intern(title))
+        refs["rating"].append(heap.intern(rating_cat or ""))
+        refs["director"].append(heap.intern(director))
+        refs["genres"].append(heap.intern(", ".join(genres)))
+    for name, pairs in refs.items():
+        if pairs:
+            records[name], records[name + "_len"] = zip(*pairs)
+
+    records["year"] = [r[0] for r in rows]
+    records["imdb_rating"] = [math.nan if r[1] is None else r[1] for r in rows]
+    records["category"] = [rating_category_index(r[2]) for r in rows]
+    records["runtime"] = [MISSING_RUNTIME if r[6] is None else max(0, min(r[6], 32767))
+                          for r in rows]
+    records["votes"] = [MISSING_VOTES if r[7] is None else r[7] for r in rows]
+    records["gross"] = [r[8] for r in rows]
+    records["meta_score"] = [MISSING_META_SCORE if math.isnan(r[9]) else r[9] for r in rows]
+
+    offset = align(f.tell())
+    f.seek(offset)
+    f.write(records.tobytes())
+    return [offset, len(records)], _year_entries(records, first_row)
+
+
+def _year_entries(records, first_row):
+    """
+    Header entries [year, first row, avg rating or None, total votes,
+    category counts, rated movies] of every year in a segment.
+    """
+    if not len(records):
+        return []
+    years = records["year"]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(years)) + 1))
+    imdb = records["imdb_rating"]
+    rated = ~np.isnan(imdb)
+    totals = np.add.reduceat(np.where(rated, imdb, 0.0), starts)
+    counts = np.add.reduceat(rated.astype(np.int64), starts)
+    votes = np.add.reduceat(np.maximum(records["votes"], 0), starts)
+    n_cats = len(RATING_CATEGORIES)
+    year_of_row = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(years))))
+    hist = np.bincount(year_of_row * n_cats + records["category"],
+                       minlength=len(starts) * n_cats).reshape(-1, n_cats)
+    return [[int(years[s]), first_row + int(s), float(t / n) if n else None, int(v), h, int(n)]
+            for s, t, n, v, h in zip(starts, totals, counts, votes, hist.tolist())]
+
+
+def build_record_store(csv_path, path=None):
+    """Write a new record store with every movie of the csv. Returns its path."""
+    path = path or record_path_for(csv_path)
+    rows = read_catalog_rows(csv_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.seek(len(MAGIC) + HEADER_SPACE)
+        segment, years = _write_segment(f, rows, StringHeap(f), 0)
+        header = {"count": len(rows), "segments": [segment], "years": years}
+        f.seek(0)
+        f.write(MAGIC)
+        f.write(encode_header(header, HEADER_SPACE))
+    os.replace(tmp_path, path)
+    return path
+
+
+def append_records(path, rows):
+    """
+    Append movies (tuples as read by read_catalog_rows(), sorted by year) whose
+    release years all come after the last year in the store. Existing records
+    and strings are never rewritten. Returns the number of movies appended.
+    """
+    if not rows:
+        return 0
+    store = RecordStore(path)
+    try:
+        header = store.header
+        last_year = int(store.year_values[-1]) if len(store.year_values) else None
+        interned = store.interned_strings()
+    finally:
+        store.close()
+    if last_year is not None and rows[0][0] <= last_year:
+        raise ValueError(f"appended years must come after {last_year}, got {rows[0][0]}")
+
+    with open(path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        segment, years = _write_segment(f, rows, StringHeap(f, interned), header["count"])
+        f.flush()
+        os.fsync(f.fileno())
+        # The records are on disk before the header points at them.
+        header["count"] += len(rows)
+        header["segments"].append(segment)
+        header["years"].extend(years)
+        f.seek(len(MAGIC))
+        f.write(encode_header(header, HEADER_SPACE))
+    return len(rows)
+
+
+def append_csv(path, csv_path):
+    """Append the movies of a csv released after the store's last year. Returns how many."""
+    store = RecordStore(path)
+    last_year = int(store.year_values[-1]) if len(store.year_values) else None
+    store.close()
+    rows = read_catalog_rows(csv_path)
+    if last_year is not None:
+        rows = rows[bisect.bisect_right([r[0] for r in rows], last_year):]
+    return append_records(path, rows)
+
+
+# ====================================================
+# READ THE STORE
+# ====================================================
+
+class RecordStore:
+    """
+    Read-only view of a record store. Each segment's records are a NumPy
+    structured array over the mapping; the year index and per-year
+    aggregates come from the header.
+    """
+
+    def __init__(self, path):
+        self.mm, self.header = map_file(path, MAGIC, HEADER_SPACE)
+        self.count = self.header["count"]
+        self.segments = [np.frombuffer(self.mm, RECORD_DTYPE, count, offset)
+                         for offset, count in self.header["segments"]]
+        # First row of every segment, to find the segment of a row.
+        self.segment_starts = np.cumsum([0] + [len(s) for s in self.segments])
+
+        years = self.header["years"]
+        self.year_values = np.array([y[0] for y in years], dtype=np.int32)
+        self.year_starts = np.array([y[1] for y in years] + [self.count], dtype=np.int64)
+        self.year_avgs = [y[2] for y in years]
+        self.year_votes = [y[3] for y in years]
+        self.year_hist = [y[4] for y in years]
+        self.year_rated = [y[5] for y in years]
+
+    def close(self):
+        self.segments = []
+        self.mm.close()
+
+    def records(self, start, end):
+        """Records of rows start to end, which lie in one segment (e.g. one year)."""
+        s = bisect.bisect_right(self.segment_starts, start) - 1
+        first = self.segment_starts[s]
+        if end > self.segment_starts[s + 1]:
+            raise IndexError("rows span more than one segment")
+        return self.segments[s][start - first:end - first]
+
+    def record(self, i):
+        return self.records(i, i + 1)[0]
+
+    def column(self, name):
+        """One field of every record; a view when the store has a single segment."""
+        if len(self.segments) == 1:
+            return self.segments[0][name]
+        return np.concatenate([s[name] for s in self.segments])
+
+    def string(self, offset, length):
+        return self.mm[offset:offset + length].decode("utf-8")
+
+    def interned_strings(self):
+        """Text -> (offset, length) of every string in the store."""
+        interned = {}
+        for name in STRING_FIELDS:
+            offsets = self.column(name)
+            unique, first = np.unique(offsets, return_index=True)
+            lengths = self.column(name + "_len")[first]
+            for offset, length in zip(unique.tolist(), lengths.tolist()):
+                interned.setdefault(self.string(offset, length), (offset, length))
+        return interned
+
+    def title(self, i):
+        r = self.record(i)
+        return self.string(int(r["title"]), int(r["title_len"]))
+
+    def director(self, i):
+        r = self.record(i)
+        return self.string(int(r["director"]), int(r["director_len"]))
+
+    def genres(self, i):
+        r = self.record(i)
+        text = self.string(int(r["genres"]), int(r["genres_len"]))
+        return text.split(", ") if text else []
+
+    def movie(self, i):
+        """Return row i as the movie dict used by Tree."""
+        r = self.record(i)
+        rating = float(r["imdb_rating"])
+        return movie_dict(self.string(int(r["title"]), int(r["title_len"])),
+                          None if math.isnan(rating) else rating,
+                          self.string(int(r["rating"]), int(r["rating_len"])),
+                          int(r["category"]))
+
+
+def load_record_trees(path):
+    """
+    Same trees as load_trees(), from a record store. Only the header is read;
+    movie dicts are built from the mapped records when a tree is drawn.
+    """
+    store = RecordStore(path)
+    trees = []
+    for i, year in enumerate(store.year_values.tolist()):
+        movies = MovieSlice(store, int(store.year_starts[i]), int(store.year_starts[i + 1]))
+        trees.append(Tree(year, store.year_avgs[i], movies, store.year_hist[i],
+                          store.year_votes[i], store.year_rated[i]))
+    return trees
+
+
+# ====================================================
+# COMMAND LINE
+# ====================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Write a new store from a csv.")
+    build.add_argument("csv")
+    build.add_argument("--out", help="Store path (default: the csv name with .records).")
+    append = commands.add_parser("append", help="Append the csv's movies of new years.")
+    append.add_argument("store")
+    append.add_argument("csv")
+    info = commands.add_parser("info", help="Print the size and years of a store.")
+    info.add_argument("store")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        path = build_record_store(args.csv, args.out)
+        print(f"wrote {path}")
+    elif args.command == "append":
+        print(f"appended {append_csv(args.store, args.csv)} movies to {args.store}")
+    else:
+        store = RecordStore(args.store)
+        years = store.year_values
+        span = f"{years[0]}-{years[-1]}" if len(years) else "none"
+        print(f"{store.count} movies, {len(years)} years ({span}), "
+              f"{len(store.segments)} segments, {os.path.getsize(args.store) / 1e6:.1f} MB")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
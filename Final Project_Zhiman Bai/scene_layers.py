@@ -0,0 +1,54 @@
+"""
+This file defines LayerCompositor, which keeps the parts of the scene that
+rarely change out of the per-frame redraw.
+
+Layers, from back to front:
+    static layer: background, title and legend, baked once into a surface.
+    slider layer: redrawn only when its key (the window start) changes.
+    tree layer:   trees and animated bulbs, redrawn every frame.
+Each frame returns the dirty rects to pass to pygame.display.update().
+"""
+
+import pygame
+
+
+class LayerCompositor:
+    def __init__(self, static_layer, slider_area, tree_area):
+        """
+        static_layer: pre-rendered surface the size of the screen.
+        slider_area: screen rect covered by the slider and its label.
+        tree_area: screen rect covered by the trees.
+        """
+        self.static_layer = static_layer
+        self.slider_area = pygame.Rect(slider_area)
+        self.tree_area = pygame.Rect(tree_area)
+        self.slider_dirty = True
+        self._slider_key = None
+        self._full_redraw = True
+
+    def invalidate(self):
+        """Force a full redraw on the next frame (e.g. after the static layer changed)."""
+        self._full_redraw = True
+
+    def begin_frame(self, screen, slider_key):
+        """
+        Restore the static layer under everything that will be redrawn this
+        frame, and return the rects that will change.
+        """
+        if self._full_redraw:
+            screen.blit(self.static_layer, (0, 0))
+            self._full_redraw = False
+            self.slider_dirty = True
+            self._slider_key = slider_key
+            return [screen.get_rect()]
+
+        # Erase last frame's trees and bulbs.
+        screen.blit(self.static_layer, self.tree_area, self.tree_area)
+        dirty = [self.tree_area]
+
+        self.slider_dirty = slider_key != self._slider_key
+        if self.slider_dirty:
+            screen.blit(self.static_layer, self.slider_area, self.slider_area)
+            dirty.append(self.slider_area)
+            self._slider_key = slider_key
+        return dirty
@@ -0,0 +1,58 @@
+"""
+This file writes synthetic movie csv files with the same columns as
+christmas_movies.csv, for benchmarking the loaders and the renderer.
+"""
+
+import csv
+import random
+
+FIELDNAMES = [
+    "title", "rating", "runtime", "imdb_rating", "meta_score", "genre",
+    "release_year", "description", "director", "stars", "votes", "gross",
+    "img_src",
+]
+RATINGS = ["G", "PG", "PG-13", "R", "TV-G", "TV-PG", "TV-14", "TV-MA", "Not Rated", ""]
+GENRES = ["Comedy", "Drama", "Romance", "Family", "Fantasy", "Animation", "Musical", "Horror"]
+WORDS = ["snow", "holiday", "family", "gift", "santa", "winter", "love", "town",
+         "magic", "reindeer", "cookie", "secret", "journey", "home", "star"]
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def write_synthetic_csv(path, years=90, movies_per_year=100, first_year=1934, seed=0):
+    """
+    Write years * movies_per_year rows in shuffled year order.
+    Some descriptions contain quotes and line breaks, like real exports.
+    Returns the number of rows written.
+    """
+    rng = random.Random(seed)
+    year_list = [first_year + i for i in range(years) for _ in range(movies_per_year)]
+    rng.shuffle(year_list)
+
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for i, year in enumerate(year_list):
+            description = _sentence(rng, rng.randint(8, 25)) + "."
+            if rng.random() < 0.1:
+                description += '\n"' + _sentence(rng, 4) + '," they said.\n'
+            writer.writerow(
+                {
+                    "title": f"{_sentence(rng, 3)} {i}",
+                    "rating": rng.choice(RATINGS),
+                    "runtime": rng.randint(60, 150) if rng.random() < 0.9 else "",
+                    "imdb_rating": round(rng.uniform(3.0, 9.0), 1) if rng.random() < 0.95 else "",
+                    "meta_score": rng.randint(20, 95) if rng.random() < 0.5 else "",
+                    "genre": ", ".join(rng.sample(GENRES, rng.randint(1, 3))),
+                    "release_year": year,
+                    "description": description,
+                    "director": f"Director {rng.randint(1, 500)}",
+                    "stars": ", ".join(f"Star {rng.randint(1, 3000)}" for _ in range(4)) + ", ",
+                    "votes": f"{rng.randint(5, 900000):,}",
+                    "gross": f"${rng.uniform(0.1, 300):.2f}M" if rng.random() < 0.4 else "",
+                    "img_src": "",
+                }
+            )
+    return len(year_list)
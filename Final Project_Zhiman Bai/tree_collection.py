@@ -0,0 +1,169 @@
+"""
+This file defines TreeCollection, which wraps the sorted list of trees from
+load_trees() together with statistics that the render loop would otherwise
+recompute every frame (rating range, movie count, per-category totals).
+The statistics are updated incrementally when trees are added, replaced,
+updated or removed.
+Prefix sums over the trees answer the slider's range summary in O(1).
+"""
+
+import bisect
+from collections import Counter
+from itertools import accumulate
+
+from visual_objects import RATING_CATEGORIES
+
+
+class RangeSummary:
+    """Statistics for a range of consecutive trees, as returned by RangeAggregates."""
+
+    def __init__(self, movie_count, avg_rating, category_counts, total_votes):
+        self.movie_count = movie_count
+        self.avg_rating = avg_rating  # Mean rating of the rated movies in the range.
+        self.category_counts = category_counts
+        self.total_votes = total_votes
+
+
+class RangeAggregates:
+    """
+    Prefix sums of movie count, rating, rating categories and votes over a
+    list of trees. Entry i holds the total of trees[:i], so any range is one
+    subtraction per statistic.
+    """
+
+    def __init__(self, trees):
+        self.movies = [0] + list(accumulate(len(t.movies) for t in trees))
+        # Yearly averages weighted by their number of rated movies, so a range
+        # average is the mean of every rated movie in it.
+        self.rating_sums = [0.0] + list(accumulate(
+            t.avg_rating * t.rated_count if t.avg_rating is not None else 0.0 for t in trees))
+        self.rated_movies = [0] + list(accumulate(
+            t.rated_count if t.avg_rating is not None else 0 for t in trees))
+        self.categories = [[0] * len(RATING_CATEGORIES)]
+        for t in trees:
+            self.categories.append([a + b for a, b in zip(self.categories[-1], t.category_counts)])
+        self.votes = [0] + list(accumulate(t.total_votes for t in trees))
+
+    def summary(self, start, end):
+        """RangeSummary of trees[start:end]."""
+        n = len(self.movies) - 1
+        start = max(0, min(start, n))
+        end = max(start, min(end, n))
+        rated = self.rated_movies[end] - self.rated_movies[start]
+        rating = (self.rating_sums[end] - self.rating_sums[start]) / rated if rated else None
+        return RangeSummary(
+            self.movies[end] - self.movies[start],
+            rating,
+            [b - a for a, b in zip(self.categories[start], self.categories[end])],
+            self.votes[end] - self.votes[start],
+        )
+
+
+class TreeCollection:
+    """
+    A year-sorted list of trees with precomputed global statistics.
+    Indexing and slicing behave like the plain list it replaces.
+    """
+
+    def __init__(self, trees=()):
+        self.trees = []
+        self.years = []
+        self._rating_counts = Counter()  # avg_rating -> number of trees.
+        self.rating_min = None
+        self.rating_max = None
+        self.movie_count = 0
+        self.category_totals = [0] * len(RATING_CATEGORIES)
+        self._ranges = None  # RangeAggregates, rebuilt after the trees change.
+        for tree in trees:
+            self.add(tree)
+
+    def __len__(self):
+        return len(self.trees)
+
+    def __iter__(self):
+        return iter(self.trees)
+
+    def __getitem__(self, index):
+        return self.trees[index]
+
+    # ----------------------------------------
+    # Incremental updates
+    # ----------------------------------------
+
+    def _count(self, tree, sign):
+        """Add (sign=1) or remove (sign=-1) one tree from the global statistics."""
+        self.movie_count += sign * len(tree.movies)
+        for i, n in enumerate(tree.category_counts):
+            self.category_totals[i] += sign * n
+
+        value = tree.avg_rating
+        if value is None:
+            return
+        if sign > 0:
+            self._rating_counts[value] += 1
+            if self.rating_min is None or value < self.rating_min:
+                self.rating_min = value
+            if self.rating_max is None or value > self.rating_max:
+                self.rating_max = value
+        else:
+            self._rating_counts[value] -= 1
+            if self._rating_counts[value] == 0:
+                del self._rating_counts[value]
+                # Only rescan the distinct ratings when an extreme disappears.
+                if value == self.rating_min:
+                    self.rating_min = min(self._rating_counts, default=None)
+                if value == self.rating_max:
+                    self.rating_max = max(self._rating_counts, default=None)
+
+    def add(self, tree):
+        """Insert a tree in year order, or replace the tree of the same year."""
+        i = bisect.bisect_left(self.years, tree.year)
+        if i < len(self.years) and self.years[i] == tree.year:
+            self.replace(i, tree)
+            return
+        self.trees.insert(i, tree)
+        self.years.insert(i, tree.year)
+        self._count(tree, 1)
+        self._ranges = None
+
+    def replace(self, index, tree):
+        """Swap the tree at index for a new one of the same year."""
+        self._count(self.trees[index], -1)
+        self.trees[index] = tree
+        self.years[index] = tree.year
+        self._count(tree, 1)
+        self._ranges = None
+
+    def update(self, index, avg_rating, movies, category_counts=None, total_votes=0,
+               rated_count=None):
+        """Change the movies of the tree at index in place (see Tree.set_movies())."""
+        tree = self.trees[index]
+        self._count(tree, -1)
+        tree.set_movies(avg_rating, movies, category_counts, total_votes, rated_count)
+        self._count(tree, 1)
+        self._ranges = None
+
+    def remove(self, index):
+        """Drop the tree at index."""
+        tree = self.trees.pop(index)
+        del self.years[index]
+        self._count(tree, -1)
+        self._ranges = None
+        return tree
+
+    # ----------------------------------------
+    # Queries
+    # ----------------------------------------
+
+    def index_of_year(self, year):
+        """Return the index of the tree for year, or None."""
+        i = bisect.bisect_left(self.years, year)
+        if i < len(self.years) and self.years[i] == year:
+            return i
+        return None
+
+    def range_summary(self, start, size):
+        """RangeSummary of trees[start:start + size], from prefix sums built once."""
+        if self._ranges is None:
+            self._ranges = RangeAggregates(self.trees)
+        return self._ranges.summary(start, start + size)
@@ -0,0 +1,91 @@
+"""
+This file defines TreeWindowManager, which virtualizes the slider window.
+Only the visible trees, plus a prefetch margin in the direction the slider is
+moving, are pinned; trees that scrolled away keep their layouts only while
+they fit in a memory budget and are evicted least-recently-used first.
+Per-movie detail (the movie dicts of lazily loaded trees) is cheap to
+rebuild, so it is released as soon as a tree leaves the pinned range.
+"""
+
+from collections import OrderedDict
+
+
+class TreeWindowManager:
+    def __init__(self, trees, window_size, prefetch=5,
+                 memory_budget=32 * 1024 * 1024, sprite_cache=None):
+        """
+        trees: the TreeCollection being shown.
+        prefetch: trees beyond the window (in the drag direction) to prepare.
+        memory_budget: bytes of layout state allowed for trees outside the pinned range.
+        sprite_cache: TreeSpriteCache whose sprites are dropped with evicted trees.
+        """
+        self.trees = trees
+        self.window_size = window_size
+        self.prefetch = prefetch
+        self.memory_budget = memory_budget
+        self.sprite_cache = sprite_cache
+        self.resident = OrderedDict()  # Tree index -> None, least recently used first.
+        self.direction = 0
+        self._last_start = None
+        self._pinned = set()
+        self.evictions = 0
+
+    def update(self, window_start):
+        """
+        Record the visible window and evict what no longer fits.
+        Returns the indexes of trees worth prefetching, nearest first.
+        """
+        n = len(self.trees)
+        window_start = max(0, min(window_start, n - 1))
+        if self._last_start is not None and window_start != self._last_start:
+            self.direction = 1 if window_start > self._last_start else -1
+        self._last_start = window_start
+
+        end = min(n, window_start + self.window_size)
+        if self.direction > 0:
+            ahead = list(range(end, min(n, end + self.prefetch)))
+        elif self.direction < 0:
+            ahead = list(range(window_start - 1, max(-1, window_start - 1 - self.prefetch), -1))
+        else:
+            # Not dragged yet: prepare a little on both sides.
+            half = self.prefetch // 2
+            ahead = list(range(end, min(n, end + half)))
+            ahead += list(range(window_start - 1, max(-1, window_start - 1 - half), -1))
+
+        pinned = set(range(window_start, end)) | set(ahead)
+        for i in self._pinned - pinned:
+            if i < n:
+                self.trees[i].release_movies()
+        self._pinned = pinned
+        for i in ahead[::-1] + list(range(window_start, end)):
+            self.resident[i] = None
+            self.resident.move_to_end(i)
+
+        self._evict(pinned)
+        return ahead
+
+    def _evict(self, pinned):
+        """Release least-recently-used unpinned trees until the rest fit the budget."""
+        unpinned = [i for i in self.resident if i not in pinned]
+        used = sum(self.trees[i].layout_nbytes() for i in unpinned)
+        for i in unpinned:
+            if used <= self.memory_budget:
+                break
+            used -= self.trees[i].layout_nbytes()
+            self.release(i)
+
+    def reset(self):
+        """Release every resident tree, e.g. before trees are inserted or removed."""
+        for index in list(self.resident):
+            self.release(index)
+        self._last_start = None
+        self._pinned = set()
+        self.direction = 0
+
+    def release(self, index):
+        tree = self.trees[index]
+        tree.release_layout()
+        if self.sprite_cache is not None:
+            self.sprite_cache.forget(tree.year)
+        self.resident.pop(index, None)
+        self.evictions += 1
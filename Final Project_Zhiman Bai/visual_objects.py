@@ -17,35 +17,82 @@ mapping ratings to colors, and computing tree height.
 #    pygame.draw.rect(), pygame.draw.circle(): for tree trunk and bulbs, arguments include surface, color, position, and optional parameters like radius.
 
 
+import hashlib
 import random
 import pygame
 import math
+import numpy as np
+from collections import OrderedDict
+
+TRUNK_W = 16
+TRUNK_H = 26
+STAR_RADIUS = 12
+STAR_COLOR = (255, 255, 0)
+BULB_RADIUS = 5
+SPARKLE_EXTRA = 3  # Extra radius of a sparkling bulb.
+SPARKLE_CHANCE = 0.02
 
 # ====================================================
 # COLOR MAPPING
 # ====================================================
 
+# Rating buckets shared by the bulb colors, legends and per-year histograms.
+RATING_CATEGORIES = ("G", "PG", "PG-13", "R", "Other")
+RATING_COLORS = (
+    (140, 220, 140),
+    (80, 200, 120),
+    (230, 200, 80),
+    (200, 70, 70),
+    (180, 180, 180),  # Not rated or other categories.
+)
+OTHER_CATEGORY = len(RATING_CATEGORIES) - 1
+
+_CATEGORY_LOOKUP = {
+    "G": 0, "TV-G": 0,
+    "PG": 1, "TV-PG": 1,
+    "PG-13": 2, "TV-14": 2,
+    "R": 3, "TV-MA": 3,
+}
+
+
+def rating_category_index(rating_cat: str):
+    """
+    Map a rating category string to its index in RATING_CATEGORIES.
+    Unknown or missing categories fall into "Other".
+    """
+    if not rating_cat:
+        return OTHER_CATEGORY
+    return _CATEGORY_LOOKUP.get(rating_cat.strip().upper(), OTHER_CATEGORY)
+
+
 def rating_to_color(rating_cat: str):
     """
     Map rating categories (G, PG, PG-13, R, Not Rated, etc.) to bulb colors.
     Used to differentiate types of movies visually.
     """
-    if not rating_cat:
-        return (180, 180, 180)
+    return RATING_COLORS[rating_category_index(rating_cat)]
 
-    r = rating_cat.strip().upper()
 
-    if r in ("G", "TV-G"):
-        return (140, 220, 140) 
-    if r in ("PG", "TV-PG"):
-        return (80, 200, 120)
-    if r in ("PG-13", "TV-14"):
-        return (230, 200, 80)
-    if r in ("R", "TV-MA"):
-        return (200, 70, 70)
+def movie_category(movie):
+    """
+    RATING_CATEGORIES index of a movie dict: its resolved "category", or
+    its "rating_cat" for dicts built without movie_dict().
+    """
+    category = movie.get("category")
+    return rating_category_index(movie.get("rating_cat")) if category is None else category
+
+
+def count_categories(movies):
+    """Count movies per rating category, in RATING_CATEGORIES order."""
+    counts = [0] * len(RATING_CATEGORIES)
+    for movie in movies:
+        counts[rating_category_index(movie["rating_cat"])] += 1
+    return counts
+
 
-    # Not rated or other categories.
-    return (180, 180, 180)
+def count_rated(movies):
+    """Number of movies with an IMDb rating."""
+    return sum(1 for movie in movies if movie["imdb_rating"] is not None)
 
 
 # ====================================================
@@ -70,8 +117,12 @@ def compute_tree_height(value, v_min, v_max,
 def position_bulbs_in_tree_random(num_bulbs, x_center, base_y,
                                   tree_width, tree_height,
                                   max_tries_per_bulb=50,
-                                  min_dist=6):
-    """Randomly place bulbs inside a triangular tree."""
+                                  min_dist=6, rng=None):
+    """
+    Randomly place bulbs inside a triangular tree.
+    rng is a random.Random; without one the global random module is used.
+    """
+    rng = rng or random
     positions = []
     if num_bulbs <= 0:
         return positions
@@ -89,14 +140,14 @@ def position_bulbs_in_tree_random(num_bulbs, x_center, base_y,
                 break
 
             # Pick a random vertical location along the tree.
-            y = random.uniform(top_y, base_y)
+            y = rng.uniform(top_y, base_y)
 
             # At higher points the tree width narrows.
             frac_from_top = (y - top_y) / tree_height  # 0 at top, 1 at base.
             half_width = (tree_width / 2) * frac_from_top
 
             # Pick a matching horizontal spot.
-            x = random.uniform(x_center - half_width, x_center + half_width)
+            x = rng.uniform(x_center - half_width, x_center + half_width)
 
             # Check distance to existing bulbs to avoid overlapping bulbs.
             ok = True
@@ -111,66 +162,544 @@ def position_bulbs_in_tree_random(num_bulbs, x_center, base_y,
     return positions
 
 
+def _too_close_to_placed(cand_x, cand_y, placed_x, placed_y, min_d2, block=4096):
+    """Boolean mask of candidates closer than min_dist to any placed bulb."""
+    close = np.zeros(len(cand_x), dtype=bool)
+    # Compare against placed bulbs in blocks to bound the k x n distance matrix.
+    for start in range(0, len(placed_x), block):
+        dx = cand_x[:, None] - placed_x[None, start:start + block]
+        dy = cand_y[:, None] - placed_y[None, start:start + block]
+        close |= ((dx * dx + dy * dy) < min_d2).any(axis=1)
+    return close
+
+
+def position_bulbs_in_tree_vectorized(num_bulbs, x_center, base_y,
+                                      tree_width, tree_height,
+                                      max_tries_per_bulb=50,
+                                      min_dist=6, batch_size=256,
+                                      max_batch_size=1024, rng=None):
+    """
+    Same contract as position_bulbs_in_tree_random(), but candidates are drawn
+    in NumPy batches and overlaps are rejected with array operations.
+    The total number of candidates is capped at num_bulbs * max_tries_per_bulb,
+    and sampling stops early once several batches in a row place almost
+    nothing (the tree is full); bulbs that still have no spot use the middle-of-tree fallback.
+    """
+    if num_bulbs <= 0:
+        return []
+    # The NumPy generator is seeded from rng, so one random.Random drives every layout mode.
+    gen = np.random if rng is None else np.random.default_rng(rng.getrandbits(64))
+
+    top_y = base_y - tree_height
+    min_d2 = min_dist ** 2
+    placed_x = np.empty(num_bulbs)
+    placed_y = np.empty(num_bulbs)
+    n = 0
+    budget = num_bulbs * max_tries_per_bulb
+    empty_batches = 0
+
+    while n < num_bulbs and budget > 0 and empty_batches < 3:
+        # Batches are capped so the k x k overlap check stays small.
+        k = min(budget, max_batch_size, max(batch_size, 2 * (num_bulbs - n)))
+        budget -= k
+
+        # Same sampling as the scalar version: a random height, then a
+        # horizontal spot inside the tree width at that height.
+        y = gen.uniform(top_y, base_y, k)
+        half_width = (tree_width / 2) * (y - top_y) / tree_height
+        x = x_center + gen.uniform(-1.0, 1.0, k) * half_width
+
+        # Reject candidates that overlap bulbs already placed.
+        keep = ~_too_close_to_placed(x, y, placed_x[:n], placed_y[:n], min_d2)
+        x, y = x[keep], y[keep]
+
+        # Reject candidates that overlap an earlier candidate of this batch.
+        if len(x) > 1:
+            dx = x[:, None] - x[None, :]
+            dy = y[:, None] - y[None, :]
+            close = np.tril((dx * dx + dy * dy) < min_d2, k=-1)
+            keep = ~close.any(axis=1)
+            x, y = x[keep], y[keep]
+
+        take = min(len(x), num_bulbs - n)
+        placed_x[n:n + take] = x[:take]
+        placed_y[n:n + take] = y[:take]
+        n += take
+        # Fewer than 1% of the candidates fit: count it as an empty batch.
+        empty_batches = empty_batches + 1 if take * 100 < k else 0
+
+    # Fallback placement roughly in the middle.
+    placed_x[n:] = x_center
+    placed_y[n:] = int((top_y + base_y) / 2)
+
+    return list(zip(placed_x.astype(int).tolist(), placed_y.astype(int).tolist()))
+
+
+def _poisson_disk_in_triangle(x_center, top_y, base_y, tree_width, radius, rng, k=30):
+    """
+    Bridson's Poisson-disk sampling clipped to the tree triangle.
+    A background grid with cells of radius / sqrt(2) holds at most one point
+    per cell, so each spacing check only looks at the neighbouring cells.
+    """
+    tree_height = base_y - top_y
+    left = x_center - tree_width / 2
+    cell = radius / math.sqrt(2)
+    cols = int(tree_width / cell) + 1
+    rows = int(tree_height / cell) + 1
+    grid = [-1] * (cols * rows)
+    r2 = radius * radius
+
+    def inside(x, y):
+        if y < top_y or y > base_y:
+            return False
+        half_width = (tree_width / 2) * (y - top_y) / tree_height
+        return abs(x - x_center) <= half_width
+
+    def fits(x, y):
+        gx = int((x - left) / cell)
+        gy = int((y - top_y) / cell)
+        for cy in range(max(0, gy - 2), min(rows, gy + 3)):
+            row = cy * cols
+            for cx in range(max(0, gx - 2), min(cols, gx + 3)):
+                i = grid[row + cx]
+                if i >= 0:
+                    px, py = points[i]
+                    if (px - x) ** 2 + (py - y) ** 2 < r2:
+                        return False
+        return True
+
+    def add(x, y):
+        grid[int((y - top_y) / cell) * cols + int((x - left) / cell)] = len(points)
+        points.append((x, y))
+        active.append(len(points) - 1)
+
+    points = []
+    active = []
+    # Start from a random point in the lower half, where the tree is widest.
+    y0 = rng.uniform((top_y + base_y) / 2, base_y)
+    half0 = (tree_width / 2) * (y0 - top_y) / tree_height
+    add(rng.uniform(x_center - half0, x_center + half0), y0)
+
+    while active:
+        j = rng.randrange(len(active))
+        px, py = points[active[j]]
+        for _ in range(k):
+            # Candidate in the annulus between radius and 2 * radius.
+            angle = rng.uniform(0, 2 * math.pi)
+            dist = radius * math.sqrt(rng.uniform(1, 4))
+            x = px + dist * math.cos(angle)
+            y = py + dist * math.sin(angle)
+            if inside(x, y) and fits(x, y):
+                add(x, y)
+                break
+        else:
+            # No room left around this point.
+            active[j] = active[-1]
+            active.pop()
+    return points
+
+
+def position_bulbs_in_tree_poisson(num_bulbs, x_center, base_y,
+                                   tree_width, tree_height,
+                                   min_dist=6, max_rounds=5, rng=None):
+    """
+    Place bulbs with Poisson-disk sampling, so they spread evenly over the tree.
+    The spacing starts from the tree area shared out between the bulbs (never
+    below min_dist) and only shrinks, below min_dist if needed, when a dense
+    year does not fit; the middle-of-tree fallback is a last resort.
+    """
+    if num_bulbs <= 0:
+        return []
+    rng = rng or random
+
+    top_y = base_y - tree_height
+    area = tree_width * tree_height / 2
+    radius = max(min_dist, math.sqrt(0.5 * area / num_bulbs))
+
+    points = []
+    for _ in range(max_rounds):
+        points = _poisson_disk_in_triangle(x_center, top_y, base_y, tree_width, radius, rng)
+        if len(points) >= num_bulbs:
+            break
+        # Shrink the spacing by how far short this round fell.
+        radius *= min(0.9, math.sqrt(len(points) / num_bulbs))
+
+    if len(points) > num_bulbs:
+        points = rng.sample(points, num_bulbs)
+    positions = [(int(x), int(y)) for x, y in points]
+
+    # Fallback placement roughly in the middle.
+    middle = (x_center, int((top_y + base_y) / 2))
+    positions.extend([middle] * (num_bulbs - len(positions)))
+    return positions
+
+
+# Bulb layout modes that Tree can be asked to use.
+BULB_LAYOUTS = {
+    "random": position_bulbs_in_tree_random,
+    "vectorized": position_bulbs_in_tree_vectorized,
+    "poisson": position_bulbs_in_tree_poisson,
+}
+DEFAULT_LAYOUT = "vectorized"
+
+
+# Background layout priorities (see layout_worker.py), most urgent first.
+LAYOUT_URGENT = 0    # A visible tree with no bulbs yet.
+LAYOUT_PREFETCH = 1  # A tree just outside the window.
+LAYOUT_REFRESH = 2   # The next update period of a tree that already shows bulbs.
+
+
+# A tree cycles through this many seeded layouts, so a long session (or an
+# export) keeps reusing the same layouts from the layout cache.
+LAYOUT_EPOCHS = 32
+
+
+def derive_seed(*parts):
+    """A 32-bit seed from any mix of ints and strings, stable across processes and runs."""
+    digest = hashlib.sha256(":".join(str(p) for p in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "little")
+
+
+def compute_layout(layout, num_bulbs, tree_width, tree_height, seed=None):
+    """
+    Bulb positions for a tree whose base center is (0, 0), as an (n, 2) int32 array.
+    Layouts are relative to the tree, so they stay valid wherever the tree is drawn
+    and can be computed away from the render loop.
+    The same seed always gives the same layout; seed=None uses the global RNGs.
+    """
+    rng = None if seed is None else random.Random(seed)
+    positions = BULB_LAYOUTS[layout](num_bulbs, 0, 0, tree_width * 0.9, tree_height * 0.9,
+                                     rng=rng)
+    return np.asarray(positions, dtype=np.int32).reshape(-1, 2)
+
+
+def cached_layout(year, key, layout_cache=None):
+    """compute_layout(*key), read from or stored in a LayoutCache when one is given."""
+    if layout_cache is None:
+        return compute_layout(*key)
+    positions = layout_cache.get(year, key)
+    if positions is None:
+        positions = compute_layout(*key)
+        layout_cache.put(year, key, positions)
+    return positions
+
+
 # ====================================================
 # CREATE CLASSES
 # ====================================================
 
 class Bulb:
-    def __init__(self, x, y, rating_cat):
+    # Slots instead of a per-instance __dict__: bulbs can number in the tens of thousands.
+    __slots__ = ("x", "y", "rating_cat", "category", "base_radius")
+
+    def __init__(self, x, y, rating_cat, category=None):
         self.x = x                    
         self.y = y                    
         self.rating_cat = rating_cat  # For picking color.
-        self.base_radius = 5  # Base radius of the bulb, which can increase temporarily when sparkling.
+        if category is None:
+            category = rating_category_index(rating_cat)
+        self.category = category  # Index into RATING_COLORS.
+        self.base_radius = BULB_RADIUS  # Base radius of the bulb, which can increase temporarily when sparkling.
 
-    def sparkle(self):
+    def sparkle(self, rng=None):
         """
         Return True occasionally (2% chance) to create a sparkling effect.
+        rng is a random.Random; without one the global random module is used.
         """
         # random. random() generates a float between 0 and 1. 
         # If the number is less than 0.02, the bulb sparkles.
-        return random.random() < 0.02
+        return (rng or random).random() < SPARKLE_CHANCE
         
-    def draw(self, surface):
+    def draw(self, surface, rng=None):
         """
         Draw the bulb onto the surface.
         """
         r = self.base_radius
-        if self.sparkle():
-            r += 3 
+        if self.sparkle(rng):
+            r += SPARKLE_EXTRA 
 
         pygame.draw.circle(
             surface,
-            rating_to_color(self.rating_cat),
+            RATING_COLORS[self.category],
             (int(self.x), int(self.y)),
             int(r)
         )
 
+class BulbStore:
+    """
+    Per-tree bulb data in preallocated arrays (x, y, color index, radius).
+    Positions are relative to the tree's base center.
+    A new layout is copied into the same arrays, so animating the bulbs does
+    not allocate one object per movie; the arrays only grow when a tree does.
+    """
+
+    def __init__(self, capacity=0):
+        self.count = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.category = np.zeros(capacity, dtype=np.uint8)
+        self.radius = np.full(capacity, BULB_RADIUS, dtype=np.uint8)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes + self.category.nbytes + self.radius.nbytes
+
+    def set_layout(self, positions, categories, radius=BULB_RADIUS):
+        """Copy positions [(x, y), ...] and color indexes into the arrays in place."""
+        n = len(categories)
+        if n > len(self.x):
+            self._allocate(n)
+        if n:
+            pos = np.asarray(positions, dtype=np.int32).reshape(-1, 2)
+            self.x[:n] = pos[:n, 0]
+            self.y[:n] = pos[:n, 1]
+            self.category[:n] = categories
+            self.radius[:n] = radius
+        self.count = n
+
+    def clear(self):
+        """Forget the layout and give the memory back."""
+        self.count = 0
+        self._allocate(0)
+
+    def views(self):
+        """Return the bulbs as Bulb objects, for code that wants one object per bulb."""
+        n = self.count
+        return [
+            Bulb(x, y, RATING_CATEGORIES[c], c)
+            for x, y, c in zip(self.x[:n].tolist(), self.y[:n].tolist(),
+                               self.category[:n].tolist())
+        ]
+
+    def draw(self, surface, x_center, base_y, sparkle_chance=SPARKLE_CHANCE, rng=None):
+        """
+        Draw every bulb with pygame.draw.circle (the unbatched path).
+        rng is a NumPy Generator for the sparkles; without one np.random is used.
+        """
+        n = self.count
+        sparkling = ((rng or np.random).random(n) < sparkle_chance).tolist()
+        for x, y, c, r, sparkle in zip(self.x[:n].tolist(), self.y[:n].tolist(),
+                                       self.category[:n].tolist(), self.radius[:n].tolist(),
+                                       sparkling):
+            if sparkle:
+                r += SPARKLE_EXTRA
+            pygame.draw.circle(surface, RATING_COLORS[c], (x_center + x, base_y + y), r)
+
+    def draw_rings(self, surface, x_center, base_y, selected, color, width=2):
+        """Ring the bulbs whose entry in the bool array selected is set."""
+        n = min(self.count, len(selected))
+        for i in np.flatnonzero(selected[:n]).tolist():
+            pygame.draw.circle(surface, color,
+                               (x_center + int(self.x[i]), base_y + int(self.y[i])),
+                               int(self.radius[i]) + SPARKLE_EXTRA + 2, width)
+
+
 class Tree:
-    def __init__(self, year, avg_rating, movies):
+    def __init__(self, year, avg_rating, movies, category_counts=None, total_votes=0,
+                 rated_count=None):
         """
         movies: list of dicts with keys "title", "imdb_rating", "rating_cat".
         years: the year represented by this tree. 
         avg_rating: average IMDb rating for this year.
+        category_counts: movies per rating category; counted from movies if not given.
+        total_votes: IMDb votes of all movies of this year.
+        rated_count: movies with a rating (the weight of avg_rating); counted from movies if not given.
         """
         self.year = year
         self.avg_rating = avg_rating # For computing tree height.
         self.movies = movies
-        self.bulbs = []  # List of bulb objects.
+        self.total_votes = total_votes
+        if category_counts is None:
+            category_counts = count_categories(movies)
+        self.category_counts = list(category_counts)
+        self.rated_count = count_rated(movies) if rated_count is None else rated_count
+        # RatingSketch of this year (rating_aggregators.py), kept by the streaming loaders.
+        self.rating_sketch = None
+        self.bulb_store = BulbStore()  # Bulb positions and colors.
+        self.seed = 0  # Base seed of the bulb layouts and sparkles (see layout_seed()).
+        self._layout_key = None  # compute_layout() arguments of the shown layout.
+        self._layout_frame = None
+        self._sparkle_rng = None  # Seeded with each layout that is shown.
+        # Back buffer: the next layout, computed by a LayoutWorker.
+        self._next_layout = None
+        self._next_key = None
+        self._next_epoch = None
+        self._next_priority = None
+        self._bulb_categories = None  # Color index of each movie, resolved once.
+        self.bulb_radii = None  # Bulb radius of each movie; None draws them all at BULB_RADIUS.
+        self._bulb_batch = None  # Cached blit list for BulbSpriteAtlas.
+
+    @property
+    def bulbs(self):
+        """The current bulbs as Bulb objects (built from bulb_store on request)."""
+        return self.bulb_store.views()
+
+    def bulb_categories(self):
+        """Color index of every movie, as a uint8 array built once per tree."""
+        if self._bulb_categories is None:
+            self._bulb_categories = np.fromiter(
+                (movie_category(movie) for movie in self.movies),
+                dtype=np.uint8, count=len(self.movies),
+            )
+        return self._bulb_categories
 
-    def update_bulbs(self, x_center, base_y, tree_width, tree_height,
-                     frame, update_period):
+    def release_movies(self):
+        """
+        Drop per-movie detail that a lazy loader can rebuild later.
+        Plain lists of movies are kept as they are.
+        """
+        release = getattr(self.movies, "release", None)
+        if release is not None:
+            release()
+
+    def layout_seed(self, epoch):
+        """Seed of the layout shown during one update period (epoch) of this tree."""
+        return derive_seed(self.seed, self.year, epoch % LAYOUT_EPOCHS)
+
+    def layout_key(self, tree_width, tree_height, layout, epoch):
+        """compute_layout() arguments for this tree at a size and epoch."""
+        return (layout, len(self.movies), int(round(tree_width)), int(round(tree_height)),
+                self.layout_seed(epoch))
+
+    def _queue_layout(self, key, epoch, priority, layout_worker):
+        if self._next_layout is not None:
+            self._next_layout.cancel()
+        self._next_layout = layout_worker.submit(*key, priority=priority, year=self.year)
+        self._next_key = key
+        self._next_epoch = epoch
+        self._next_priority = priority
+
+    def prefetch_layout(self, tree_width, tree_height, frame, update_period, layout,
+                        layout_worker):
+        """Start computing a layout before the tree is visible, so it appears with bulbs."""
+        epoch = frame // update_period
+        key = self.layout_key(tree_width, tree_height, layout, epoch)
+        if key != self._layout_key and self._next_key != key:
+            self._queue_layout(key, epoch, LAYOUT_PREFETCH, layout_worker)
+
+    def layout_nbytes(self):
+        """Rough size of the layout state this tree holds (bulb arrays and blit list)."""
+        n = self.bulb_store.nbytes
+        if self._bulb_categories is not None:
+            n += self._bulb_categories.nbytes
+        if self._bulb_batch is not None:
+            n += 64 * len(self._bulb_batch[1])  # One (sprite, (x, y)) tuple per bulb.
+        return n
+
+    def release_layout(self):
+        """
+        Drop bulb layouts, pending layout work and per-movie detail.
+        Everything is rebuilt the next time the tree is drawn.
+        """
+        self.bulb_store.clear()
+        self._layout_key = None
+        self._layout_frame = None
+        self._sparkle_rng = None
+        self._bulb_batch = None
+        self._bulb_categories = None
+        if self._next_layout is not None:
+            self._next_layout.cancel()
+        self._next_layout = None
+        self._next_key = None
+        self._next_epoch = None
+        self._next_priority = None
+        self.release_movies()
+
+    def set_movies(self, avg_rating, movies, category_counts=None, total_votes=0,
+                   rated_count=None):
+        """
+        Replace the movies of this year in place (e.g. after the csv changed).
+        Layouts and per-movie state are dropped; the seed is kept.
+        """
+        self.release_layout()
+        self.avg_rating = avg_rating
+        self.movies = movies
+        self.total_votes = total_votes
+        if category_counts is None:
+            category_counts = count_categories(movies)
+        self.category_counts = list(category_counts)
+        self.rated_count = count_rated(movies) if rated_count is None else rated_count
+        self.bulb_radii = None
+
+    def set_bulb_radii(self, radii):
+        """Change the bulb sizes (see bulb_radii) without placing the bulbs again."""
+        self.bulb_radii = radii
+        n = self.bulb_store.count
+        if n:
+            self.bulb_store.radius[:n] = BULB_RADIUS if radii is None else radii[:n]
+            self._bulb_batch = None
+
+    def _show_layout(self, key, positions):
+        radius = BULB_RADIUS if self.bulb_radii is None else self.bulb_radii
+        self.bulb_store.set_layout(positions, self.bulb_categories(), radius)
+        self._layout_key = key
+        self._bulb_batch = None
+        # Sparkles follow the layout's seed, so a replayed period sparkles the same way.
+        self._sparkle_rng = np.random.default_rng(key[-1])
+
+    def update_bulbs(self, tree_width, tree_height, frame, update_period,
+                     layout=DEFAULT_LAYOUT, layout_worker=None, layout_cache=None):
         """
         Update bulb positions every update_period frames to animate them.
+        layout picks the placement function from BULB_LAYOUTS.
+        Each update period (epoch) has its own seeded layout, so the animation
+        is reproducible and layouts can be kept in a LayoutCache.
+
+        Without a layout_worker the new layout is computed right here.
+        With one, layouts are double-buffered: the layout for the next period is
+        computed in the background and swapped in at the period tick once it is
+        ready, so this call never waits for bulb placement.
         """
-        if (not self.bulbs) or (frame % update_period == 0):
-            positions = position_bulbs_in_tree_random(
-                len(self.movies), x_center, base_y,
-                tree_width * 0.9, tree_height * 0.9
-            )
-            self.bulbs = [
-                Bulb(px, py, movie["rating_cat"])
-                for (px, py), movie in zip(positions, self.movies)
-            ]
+        # Already updated this frame (e.g. by a benchmark's separate layout phase).
+        if frame == self._layout_frame:
+            return
+        self._layout_frame = frame
+
+        epoch = frame // update_period
+        key = self.layout_key(tree_width, tree_height, layout, epoch)
+
+        if layout_worker is None:
+            if key != self._layout_key:
+                self._show_layout(key, cached_layout(self.year, key, layout_cache))
+            return
+
+        if self._layout_key is not None and self._layout_key[:4] != key[:4]:
+            # Size or movie count changed: the shown layout no longer fits the tree.
+            self.bulb_store.count = 0
+            self._bulb_batch = None
+            self._layout_key = None
+
+        if self._next_layout is not None and self._next_layout.cancelled():
+            self._next_layout = None
+        pending = self._next_layout is not None and self._next_key[:4] == key[:4]
+        # Swap in the back buffer at the period tick. A layout that finished
+        # late (for an earlier period) is still newer than the one shown.
+        if (pending and key != self._layout_key and self._next_epoch <= epoch
+                and self._next_layout.done()):
+            self._show_layout(self._next_key, self._next_layout.result())
+            self._next_layout = None
+            pending = False
+
+        # Keep the back buffer busy: with this period's layout until it is
+        # shown (the old one stays up meanwhile), then with the next period's.
+        # A job still running for this size is never restarted, so a busy
+        # worker cannot starve a tree by chasing the period ticks.
+        # A visible tree without bulbs jumps ahead of prefetches and refreshes.
+        priority = LAYOUT_URGENT if self.bulb_store.count == 0 else LAYOUT_REFRESH
+        if pending and not self._next_layout.done():
+            if priority < self._next_priority and not self._next_layout.running():
+                self._queue_layout(self._next_key, self._next_epoch, priority, layout_worker)
+            return
+        wanted_epoch = epoch if key != self._layout_key else epoch + 1
+        wanted = self.layout_key(tree_width, tree_height, layout, wanted_epoch)
+        if self._next_layout is None or self._next_key != wanted:
+            self._queue_layout(wanted, wanted_epoch, priority, layout_worker)
 
     def draw_star(self, surface, center_x, center_y, radius, color):
         points = []
@@ -190,23 +719,13 @@ class Tree:
         pygame.draw.polygon(surface, color, points)
 
 
-    def draw(self, surface, font, x_center, base_y, tree_width,
-             height, frame, update_period,
-             tree_color, trunk_color, text_color):
-        """
-        Draw trunk, tree triangle, bulb animation, star, and year label.
-        """
-        # Update bulb locations for animation.
-        self.update_bulbs(x_center, base_y, tree_width, height,
-                          frame, update_period)
-
+    def draw_trunk_and_canopy(self, surface, x_center, base_y, tree_width,
+                              height, tree_color, trunk_color):
         # Draw trunk.
-        trunk_w = 16
-        trunk_h = 26
         pygame.draw.rect(
             surface,
             trunk_color,
-            (x_center - trunk_w // 2, base_y, trunk_w, trunk_h),
+            (x_center - TRUNK_W // 2, base_y, TRUNK_W, TRUNK_H),
         )
 
         # Draw tree shape (triangle).
@@ -217,16 +736,215 @@ class Tree:
         ]
         pygame.draw.polygon(surface, tree_color, pts)
 
-        # Draw bulbs.
-        for bulb in self.bulbs:
-            # bulb.draw(surface, radius=5)
-            bulb.draw(surface)
-
+    def draw_star_and_label(self, surface, font, x_center, base_y, height, text_color):
         # Draw star at top.
-        self.draw_star(surface, x_center, base_y - height, radius=12, color=(255, 255, 0))
-
+        self.draw_star(surface, x_center, base_y - height, radius=STAR_RADIUS, color=STAR_COLOR)
 
         # Draw year label.
-        year_text = font.render(str(self.year), True, text_color)
-        rect = year_text.get_rect(center=(x_center, base_y + trunk_h + 20))
+        year_text = TEXT_CACHE.render(font, str(self.year), text_color)
+        rect = year_text.get_rect(center=(x_center, base_y + TRUNK_H + 20))
         surface.blit(year_text, rect)
+
+    def draw(self, surface, font, x_center, base_y, tree_width,
+             height, frame, update_period,
+             tree_color, trunk_color, text_color, layout=DEFAULT_LAYOUT,
+             sprite_cache=None, bulb_atlas=None, layout_worker=None, layout_cache=None,
+             highlight=None, highlight_color=(255, 255, 255)):
+        """
+        Draw trunk, tree triangle, bulb animation, star, and year label.
+        With a TreeSpriteCache, everything except the bulbs is one cached blit.
+        With a BulbSpriteAtlas, all bulbs of the tree go out in one Surface.blits() call.
+        With a LayoutWorker, bulb layouts are computed in the background.
+        With a LayoutCache, layouts computed in earlier sessions are reused.
+        highlight is a bool array over the movies; their bulbs get a ring.
+        """
+        # Update bulb locations for animation.
+        self.update_bulbs(tree_width, height, frame, update_period,
+                          layout, layout_worker, layout_cache)
+
+        if sprite_cache is not None:
+            sprite, (ox, oy) = sprite_cache.get(self, font, tree_width, height,
+                                                tree_color, trunk_color, text_color)
+            surface.blit(sprite, (x_center - ox, base_y - oy))
+        else:
+            self.draw_trunk_and_canopy(surface, x_center, base_y, tree_width,
+                                       height, tree_color, trunk_color)
+
+        # Draw bulbs.
+        if bulb_atlas is not None:
+            origin = (x_center, base_y)
+            if self._bulb_batch is None or self._bulb_batch[0] != origin:
+                self._bulb_batch = (origin, bulb_atlas.build_batch(self.bulb_store, *origin))
+            bulb_atlas.draw_batch(surface, self._bulb_batch[1], self.bulb_store, *origin,
+                                  rng=self._sparkle_rng)
+        else:
+            self.bulb_store.draw(surface, x_center, base_y, rng=self._sparkle_rng)
+        if highlight is not None:
+            self.bulb_store.draw_rings(surface, x_center, base_y, highlight, highlight_color)
+
+        if sprite_cache is None:
+            self.draw_star_and_label(surface, font, x_center, base_y, height, text_color)
+
+
+# ====================================================
+# BULB SPRITES
+# ====================================================
+
+class BulbSpriteAtlas:
+    """
+    Anti-aliased bulb sprites for every rating color and radius (including
+    the sparkling radius), rendered once on first use and blitted in batches.
+    """
+
+    def __init__(self, sparkle_extra=SPARKLE_EXTRA, sparkle_chance=SPARKLE_CHANCE):
+        self.sparkle_extra = sparkle_extra
+        self.sparkle_chance = sparkle_chance
+        self.sprites = {}  # (category, radius) -> (surface, offset to its top-left).
+        for category in range(len(RATING_COLORS)):
+            self.sprite(category, BULB_RADIUS)
+            self.sprite(category, BULB_RADIUS + sparkle_extra)
+
+    def sprite(self, category, radius):
+        entry = self.sprites.get((category, radius))
+        if entry is None:
+            entry = self.sprites[(category, radius)] = self.render(RATING_COLORS[category], radius)
+        return entry
+
+    @staticmethod
+    def render(color, radius, supersample=4):
+        """Draw a circle at supersample times the size and smooth-scale it down for soft edges."""
+        size = 2 * radius + 2
+        big = pygame.Surface((size * supersample, size * supersample), pygame.SRCALPHA)
+        c = radius + 1
+        pygame.draw.circle(big, color, (c * supersample, c * supersample), radius * supersample)
+        sprite = pygame.transform.smoothscale(big, (size, size))
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        return sprite, c
+
+    def build_batch(self, store, x_center, base_y):
+        """
+        Build the (sprite, position) list for a tree's BulbStore at normal size.
+        It stays valid until the bulbs or the tree move, so trees keep it between frames.
+        """
+        n = store.count
+        batch = []
+        for x, y, cat, r in zip(store.x[:n].tolist(), store.y[:n].tolist(),
+                                store.category[:n].tolist(), store.radius[:n].tolist()):
+            sprite, c = self.sprite(cat, r)
+            batch.append((sprite, (x_center + x - c, base_y + y - c)))
+        return batch
+
+    def draw_batch(self, surface, batch, store, x_center, base_y, rng=None):
+        """
+        Blit a batch from build_batch() with one Surface.blits() call.
+        Only the few bulbs that sparkle this frame are swapped for the bigger sprite.
+        rng is a NumPy Generator for the sparkles; without one np.random is used.
+        """
+        if not batch:
+            return
+        sparkles = (rng or np.random).random(len(batch)) < self.sparkle_chance
+        sparkling = np.flatnonzero(sparkles).tolist()
+        saved = []
+        for i in sparkling:
+            sprite, c = self.sprite(int(store.category[i]), int(store.radius[i]) + self.sparkle_extra)
+            saved.append(batch[i])
+            batch[i] = (sprite, (x_center + int(store.x[i]) - c, base_y + int(store.y[i]) - c))
+        surface.blits(batch, doreturn=False)
+        for i, entry in zip(sparkling, saved):
+            batch[i] = entry
+
+
+# ====================================================
+# TREE SPRITE CACHE
+# ====================================================
+
+class TreeSpriteCache:
+    """
+    Pre-rendered tree bodies (trunk, canopy, star and year label), keyed by
+    year, height, width, colors and font, with least-recently-used eviction.
+    """
+
+    def __init__(self, max_sprites=128):
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tree, font, tree_width, height, tree_color, trunk_color, text_color):
+        """Return (sprite, (anchor_x, anchor_y)); the anchor is the tree's base center."""
+        height = int(round(height))
+        key = (tree.year, height, tree_width, tree_color, trunk_color, text_color, font)
+        entry = self.sprites.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = self.sprites[key] = self.render(tree, font, tree_width, height,
+                                                tree_color, trunk_color, text_color)
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return entry
+
+    def forget(self, year):
+        """Drop every sprite of one tree."""
+        for key in [k for k in self.sprites if k[0] == year]:
+            del self.sprites[key]
+
+    @staticmethod
+    def render(tree, font, tree_width, height, tree_color, trunk_color, text_color):
+        label_w, label_h = font.size(str(tree.year))
+        width = max(tree_width, 2 * STAR_RADIUS, label_w) + 2
+        above = height + STAR_RADIUS + 1
+        below = TRUNK_H + 20 + label_h // 2 + 2
+        sprite = pygame.Surface((width, above + below), pygame.SRCALPHA)
+
+        anchor = (width // 2, above)
+        tree.draw_trunk_and_canopy(sprite, anchor[0], anchor[1], tree_width,
+                                   height, tree_color, trunk_color)
+        tree.draw_star_and_label(sprite, font, anchor[0], anchor[1], height, text_color)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        return sprite, anchor
+
+
+# ====================================================
+# TEXT CACHE
+# ====================================================
+
+class TextCache:
+    """
+    Rendered text surfaces keyed by (font, text, color, antialias), with
+    least-recently-used eviction. Year labels, the slider label, the legend
+    and the title go through the shared TEXT_CACHE below, so each distinct
+    string is rasterized once instead of every frame.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        """Same as font.render(text, antialias, color), but cached."""
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = self.surfaces[key] = font.render(text, antialias, color)
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+TEXT_CACHE = TextCache()